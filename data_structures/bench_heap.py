@@ -0,0 +1,211 @@
+"""
+bench_heap.py
+
+Benchmark suite for Heap. Reports operations per second and comparisons per
+operation for push, pop, delete, heapify and a mixed push/pop workload, over a
+range of sizes and key distributions, next to the same workload run with heapq.
+
+Heap is benchmarked as a min heap so that both sides do the same work. The
+comparison counts are taken in a separate, untimed run so that counting does
+not distort the timings. With --debug, Heap runs use CheckedHeap, which checks
+the heap invariant after every mutation; timings and comparison counts then
+include the cost of the checks.
+
+Usage:
+$ python bench_heap.py [--sizes 1e3,1e4,1e5] [--distributions random,sorted]
+	[--workloads push,pop] [--debug]
+"""
+import argparse
+import heapq
+import random
+import time
+from heap import Heap
+from heap_debug import CheckedHeap
+from heap_keys import DISTRIBUTIONS, keys
+
+WORKLOADS = ['push', 'pop', 'delete', 'heapify', 'mixed']
+
+class Counter:
+	def __init__(self):
+		self.count = 0
+
+class Counted:
+	"""
+	Key wrapper that counts the comparisons heapq makes
+	"""
+	__slots__ = ('key', 'counter')
+
+	def __init__(self, key, counter):
+		self.key = key
+		self.counter = counter
+
+	def __lt__(self, other):
+		self.counter.count += 1
+		return self.key < other.key
+
+def coin_flips(size, seed=1):
+	rng = random.Random(seed)
+	return [rng.randint(0, 1) == 0 for i in range(0, size)]
+
+def delete_positions(size, seed=2):
+	# Raw random numbers, reduced modulo the current heap size at delete time
+	rng = random.Random(seed)
+	return [rng.randrange(0, size) for i in range(0, max(size // 10, 1))]
+
+"""
+Each workload takes a heap constructor and a list of keys, does all untimed
+setup, and returns (ops, run) where run() performs the timed operations.
+"""
+
+def heap_push(new_heap, l):
+	def run():
+		h = new_heap()
+		for x in l:
+			h.push(x)
+	return len(l), run
+
+def heap_pop(new_heap, l):
+	h = new_heap()
+	h.heapify(l)
+	def run():
+		for i in range(0, len(l)):
+			h.pop()
+	return len(l), run
+
+def heap_delete(new_heap, l):
+	h = new_heap()
+	h.heapify(l)
+	positions = delete_positions(len(l))
+	def run():
+		for p in positions:
+			h.delete(p % len(h))
+	return len(positions), run
+
+def heap_heapify(new_heap, l):
+	h = new_heap()
+	def run():
+		h.heapify(l)
+	return len(l), run
+
+def heap_mixed(new_heap, l):
+	h = new_heap()
+	half = len(l) // 2
+	h.heapify(l[0:half])
+	flips = coin_flips(len(l))
+	def run():
+		for i in range(half, len(l)):
+			h.push(l[i])
+			if flips[i]:
+				h.pop()
+	return (len(l)-half) + sum(flips[half:]), run
+
+def heapq_push(l):
+	def run():
+		h = []
+		for x in l:
+			heapq.heappush(h, x)
+	return len(l), run
+
+def heapq_pop(l):
+	h = list(l)
+	heapq.heapify(h)
+	def run():
+		for i in range(0, len(l)):
+			heapq.heappop(h)
+	return len(l), run
+
+def heapq_delete(l):
+	h = list(l)
+	heapq.heapify(h)
+	positions = delete_positions(len(l))
+	def run():
+		# heapq has no delete, so use its (private) sift helpers the same way
+		# Heap.delete does
+		for p in positions:
+			idx = p % len(h)
+			last = h.pop()
+			if idx < len(h):
+				h[idx] = last
+				heapq._siftup(h, idx)
+				heapq._siftdown(h, 0, idx)
+	return len(positions), run
+
+def heapq_heapify(l):
+	h = list(l)
+	def run():
+		heapq.heapify(h)
+	return len(l), run
+
+def heapq_mixed(l):
+	half = len(l) // 2
+	h = l[0:half]
+	heapq.heapify(h)
+	flips = coin_flips(len(l))
+	def run():
+		for i in range(half, len(l)):
+			heapq.heappush(h, l[i])
+			if flips[i]:
+				heapq.heappop(h)
+	return (len(l)-half) + sum(flips[half:]), run
+
+HEAP_WORKLOADS = {'push': heap_push, 'pop': heap_pop, 'delete': heap_delete,
+	'heapify': heap_heapify, 'mixed': heap_mixed}
+HEAPQ_WORKLOADS = {'push': heapq_push, 'pop': heapq_pop, 'delete': heapq_delete,
+	'heapify': heapq_heapify, 'mixed': heapq_mixed}
+
+def timed(workload):
+	ops, run = workload
+	t0 = time.perf_counter()
+	run()
+	t1 = time.perf_counter()
+	return ops / (t1-t0) if t1 > t0 else float('inf')
+
+def bench_heap(workload, l, debug):
+	heap_class = CheckedHeap if debug else Heap
+	ops_per_sec = timed(HEAP_WORKLOADS[workload](lambda: heap_class(lambda x,y: x > y), l))
+
+	counter = Counter()
+	def compare(x, y):
+		counter.count += 1
+		return x > y
+	ops, run = HEAP_WORKLOADS[workload](lambda: heap_class(compare), l)
+	counter.count = 0
+	run()
+	return ops_per_sec, counter.count / ops
+
+def bench_heapq(workload, l):
+	ops_per_sec = timed(HEAPQ_WORKLOADS[workload](l))
+
+	counter = Counter()
+	ops, run = HEAPQ_WORKLOADS[workload]([Counted(x, counter) for x in l])
+	counter.count = 0
+	run()
+	return ops_per_sec, counter.count / ops
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark Heap against heapq')
+	parser.add_argument('--sizes', default='1e3,1e4,1e5',
+		help='comma separated heap sizes, e.g. 1e3,1e7')
+	parser.add_argument('--distributions', default=','.join(DISTRIBUTIONS))
+	parser.add_argument('--workloads', default=','.join(WORKLOADS))
+	parser.add_argument('--debug', action='store_true',
+		help='check the heap invariant after every mutation')
+	args = parser.parse_args()
+
+	sizes = [int(float(s)) for s in args.sizes.split(',')]
+	distributions = args.distributions.split(',')
+	workloads = args.workloads.split(',')
+
+	print('{:>9} {:>11} {:>8} | {:>12} {:>7} | {:>12} {:>7}'.format(
+		'size', 'keys', 'workload', 'Heap ops/s', 'cmp/op', 'heapq ops/s', 'cmp/op'))
+	for size in sizes:
+		for distribution in distributions:
+			l = keys(distribution, size)
+			for workload in workloads:
+				heap_ops, heap_cmp = bench_heap(workload, l, args.debug)
+				heapq_ops, heapq_cmp = bench_heapq(workload, l)
+				print('{:>9} {:>11} {:>8} | {:>12.0f} {:>7.2f} | {:>12.0f} {:>7.2f}'.format(
+					size, distribution, workload, heap_ops, heap_cmp, heapq_ops, heapq_cmp))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,69 @@
+"""
+bench_priority_queue.py
+
+Throughput of ConcurrentHeap against queue.PriorityQueue with several producer
+threads and a single consumer.
+
+Usage:
+$ python bench_priority_queue.py [items_per_producer] [batch_size]
+"""
+import queue
+import random
+import sys
+import threading
+import time
+from priority_queue import ConcurrentHeap
+
+PRODUCERS = [1, 2, 4, 8, 16]
+
+def run(num_producers, items, put, consume):
+	"""
+	Starts num_producers threads that each call put on their own list of items,
+	runs consume(total) on the current thread, and returns items per second.
+	"""
+	data = [[random.random() for i in range(0, items)] for p in range(0, num_producers)]
+	start = threading.Barrier(num_producers+1)
+	def producer(elms):
+		start.wait()
+		for elm in elms:
+			put(elm)
+	threads = [threading.Thread(target=producer, args=(elms,)) for elms in data]
+	for t in threads:
+		t.start()
+	start.wait()
+	t0 = time.perf_counter()
+	consume(num_producers*items)
+	t1 = time.perf_counter()
+	for t in threads:
+		t.join()
+	return num_producers*items / (t1-t0)
+
+def bench_stdlib(num_producers, items):
+	q = queue.PriorityQueue()
+	def consume(total):
+		for i in range(0, total):
+			q.get()
+	return run(num_producers, items, q.put, consume)
+
+def bench_pop(num_producers, items):
+	h = ConcurrentHeap()
+	def consume(total):
+		for i in range(0, total):
+			h.pop()
+	return run(num_producers, items, h.push, consume)
+
+def bench_drain(num_producers, items, batch):
+	h = ConcurrentHeap()
+	def consume(total):
+		while total > 0:
+			total -= len(h.drain(batch, block=True))
+	return run(num_producers, items, h.push, consume)
+
+if __name__ == '__main__':
+	items = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	batch = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+	print('{:>9} {:>16} {:>16} {:>16}'.format('producers', 'PriorityQueue', 'pop', 'drain({})'.format(batch)))
+	for p in PRODUCERS:
+		print('{:>9} {:>16.0f} {:>16.0f} {:>16.0f}'.format(
+			p, bench_stdlib(p, items), bench_pop(p, items), bench_drain(p, items, batch)))
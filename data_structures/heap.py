@@ -9,14 +9,24 @@ The underlying heap array is 0-indexed, thus each index k has children
 By default, Heap implements a max heap. This behavior can be changed by
 changing the input "comparator" comparison operator that a heap is
 initialized with.
+
+The heap array is a plain list holding exactly the elements in the heap, so
+popped elements are released immediately. Storage follows the list's own
+growth policy: it over-allocates by about 1/8 when growing and only gives
+memory back once fewer than half of the allocated slots are in use, which
+keeps a heap oscillating around one size from repeatedly reallocating.
 """
 
 class Heap:
+	__slots__ = ('_compare', '_array')
+
 	def __init__(self, comparator=lambda x,y: x < y):
-		self._size = 0
 		self._compare = comparator
 		self._array = []
 
+	def __len__(self):
+		return len(self._array)
+
 	def __getitem__(self, idx):
 		return self._array[idx]
 
@@ -24,65 +34,117 @@ class Heap:
 		self._array[idx] = elm
 
 	def __str__(self):
-		return self._array[0:self._size].__str__()
+		return self._array.__str__()
 
 	def __repr__(self):
 		return self.__str__()
 
-	def _sift_up(self, idx):
-		elm = self._array[idx]
+	def _sift_up(self, idx, top=0):
+		"""
+		Moves the element at idx up towards index top until its parent has
+		higher priority
+		"""
+		array = self._array
+		compare = self._compare
+		elm = array[idx]
 		curr = idx
-		par = (idx-1) >> 1
-		while (curr > 0) and self._compare(self._array[par], elm):
-			self._array[curr] = self._array[par]
-			curr = par
+		while curr > top:
 			par = (curr-1) >> 1
-		self._array[curr] = elm
+			if not compare(array[par], elm):
+				break
+			array[curr] = array[par]
+			curr = par
+		array[curr] = elm
 
 	def _sift_down(self, idx):
-		elm = self._array[idx]
+		"""
+		Moves the hole at idx down to a leaf, always following the higher
+		priority child, then sifts the element back up from there. The element
+		sifted down is usually the last one in the array, which almost always
+		belongs near the leaves, so this costs about one comparison per level
+		instead of the two an early-exit sift down needs.
+		"""
+		array = self._array
+		compare = self._compare
+		size = len(array)
+		elm = array[idx]
 		curr = idx
-		l_child = (idx << 1) + 1
-		while l_child < self._size:
-			r_child = l_child+1
-			if l_child+1 < self._size and self._compare(self._array[l_child], self._array[r_child]):
-				self._array[curr] = self._array[r_child]
-				curr = r_child
-				l_child = (curr << 1) + 1
-			else:
-				self._array[curr] = self._array[l_child]
-				curr = l_child
-				l_child = (curr << 1) + 1
-		self._array[curr] = elm
-		self._sift_up(curr)
+		child = (idx << 1) + 1
+		while child < size:
+			r_child = child+1
+			if r_child < size and compare(array[child], array[r_child]):
+				child = r_child
+			array[curr] = array[child]
+			curr = child
+			child = (curr << 1) + 1
+		array[curr] = elm
+		self._sift_up(curr, idx)
 
 	def peek(self):
-		if self._size == 0:
+		if not self._array:
 			return None
 		return self._array[0]
 
 	def pop(self):
-		if self._size == 0:
+		array = self._array
+		if not array:
 			return None
-		elm = self._array[0]
-		self._array[0] = self._array[self._size-1]
-		self._size -= 1
+		last = array.pop()
+		if not array:
+			return last
+		elm = array[0]
+		array[0] = last
 		self._sift_down(0)
 		return elm
 
 	def push(self, elm):
-		if self._size < len(self._array):
-			self._array[self._size] = elm
-		else:
-			self._array.append(elm)
-		self._size += 1
-		self._sift_up(self._size-1)
+		self._array.append(elm)
+		self._sift_up(len(self._array)-1)
+
+	def heapify(self, elms):
+		"""
+		Adds every element of elms and restores the heap invariant in O(n)
+		by sifting down each parent, starting from the last one
+		"""
+		array = self._array
+		array.extend(elms)
+		for idx in range((len(array) >> 1) - 1, -1, -1):
+			self._sift_down(idx)
+
+	def replace(self, elm):
+		"""
+		Pops the top element and pushes elm in a single sift. Returns the old
+		top element, or None if the heap was empty.
+		"""
+		array = self._array
+		if not array:
+			array.append(elm)
+			return None
+		top = array[0]
+		array[0] = elm
+		self._sift_down(0)
+		return top
+
+	def pushpop(self, elm):
+		"""
+		Pushes elm and then pops the top element. If elm would immediately be
+		popped again the heap is not touched.
+		"""
+		array = self._array
+		if array and self._compare(elm, array[0]):
+			elm, array[0] = array[0], elm
+			self._sift_down(0)
+		return elm
 
 	def delete(self, idx):
-		if idx < 0 or idx >= self._size:
+		array = self._array
+		if idx < 0 or idx >= len(array):
 			return
-		self._array[idx] = self._array[self._size-1]
-		self._sift_up(idx)
-		self._sift_down(idx)
-		self._size -= 1
-
+		last = array.pop()
+		if idx == len(array):
+			return
+		array[idx] = last
+		if idx > 0 and self._compare(array[(idx-1) >> 1], last):
+			self._sift_up(idx)
+		else:
+			self._sift_down(idx)
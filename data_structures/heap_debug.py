@@ -0,0 +1,102 @@
+"""
+heap_debug.py
+
+Invariant checking for Heap.
+
+check_invariant verifies the whole heap in O(n). CheckedHeap is a drop-in Heap
+that verifies the invariant incrementally after every mutation: its array
+records which slots were written, and only the parent/child edges touching
+those slots are checked. Edges between untouched slots cannot have changed, so
+this is equivalent to a full check at the cost of the mutation itself.
+"""
+from heap import Heap
+
+class HeapInvariantError(AssertionError):
+	pass
+
+def check_invariant(h):
+	"""
+	Returns True if no element of h has higher priority than its parent
+	"""
+	compare = h._compare
+	for i in range(1, len(h)):
+		if compare(h[(i-1) >> 1], h[i]):
+			return False
+	return True
+
+class _TrackedList(list):
+	"""
+	List that remembers which indices have been written since the last check
+	"""
+	def __init__(self, *args):
+		list.__init__(self, *args)
+		self.touched = set(range(0, len(self)))
+
+	def __setitem__(self, idx, elm):
+		list.__setitem__(self, idx, elm)
+		if isinstance(idx, slice):
+			self.touched.update(range(*idx.indices(len(self))))
+		else:
+			self.touched.add(idx % len(self))
+
+	def append(self, elm):
+		list.append(self, elm)
+		self.touched.add(len(self)-1)
+
+	def extend(self, elms):
+		start = len(self)
+		list.extend(self, elms)
+		self.touched.update(range(start, len(self)))
+
+class CheckedHeap(Heap):
+	"""
+	Heap that raises HeapInvariantError as soon as a mutation leaves the heap
+	invalid. Writes through __setitem__ are not checked until the next
+	mutating call, since callers use it to stage an element before sifting.
+	"""
+	__slots__ = ()
+
+	def __init__(self, comparator=lambda x,y: x < y):
+		Heap.__init__(self, comparator)
+		self._array = _TrackedList()
+
+	def _check(self, operation):
+		array = self._array
+		compare = self._compare
+		size = len(array)
+		for i in array.touched:
+			if i >= size:
+				continue
+			if i > 0 and compare(array[(i-1) >> 1], array[i]):
+				raise HeapInvariantError('{}: element {} at index {} outranks its parent'.format(operation, array[i], i))
+			for child in ((i << 1) + 1, (i << 1) + 2):
+				if child < size and compare(array[i], array[child]):
+					raise HeapInvariantError('{}: element {} at index {} outranks its parent'.format(operation, array[child], child))
+		array.touched.clear()
+
+	def push(self, elm):
+		Heap.push(self, elm)
+		self._check('push')
+
+	def pop(self):
+		elm = Heap.pop(self)
+		self._check('pop')
+		return elm
+
+	def delete(self, idx):
+		Heap.delete(self, idx)
+		self._check('delete')
+
+	def heapify(self, elms):
+		Heap.heapify(self, elms)
+		self._check('heapify')
+
+	def replace(self, elm):
+		top = Heap.replace(self, elm)
+		self._check('replace')
+		return top
+
+	def pushpop(self, elm):
+		top = Heap.pushpop(self, elm)
+		self._check('pushpop')
+		return top
@@ -0,0 +1,20 @@
+"""
+heap_keys.py
+
+Key sequences shared by the Heap tests and benchmarks.
+"""
+import random
+
+DISTRIBUTIONS = ['random', 'sorted', 'reversed', 'duplicates']
+
+def keys(distribution, size, seed=0):
+	rng = random.Random(seed)
+	if distribution == 'random':
+		return [rng.random() for i in range(0, size)]
+	if distribution == 'sorted':
+		return list(range(0, size))
+	if distribution == 'reversed':
+		return list(range(size, 0, -1))
+	if distribution == 'duplicates':
+		return [rng.randint(0, 9) for i in range(0, size)]
+	raise ValueError('unknown key distribution: {}'.format(distribution))
@@ -0,0 +1,109 @@
+"""
+merge.py
+
+Lazy k-way merge of sorted runs using Heap.
+
+The heap holds one entry per source: the source's current head together with
+the block of items it was read from. Sources are read a block at a time, so
+memory is proportional to the number of runs times the block size rather than
+to the total amount of data, and the merged output is produced lazily.
+
+Ties between equal keys are broken by source order (items from earlier
+sources come first), and items from the same source keep their order, so the
+merge is stable.
+"""
+from itertools import islice
+from heap import Heap
+
+# Entry layout: [key, source index, current item, block, position in block, block iterator]
+KEY, SOURCE, ITEM, BLOCK, POS, BLOCKS = range(6)
+
+def _iter_blocks(source, block_size):
+	"""
+	Yields lists of up to block_size items read from an iterable
+	"""
+	it = iter(source)
+	while True:
+		block = list(islice(it, block_size))
+		if not block:
+			return
+		yield block
+
+def _file_blocks(f, block_size, parse):
+	"""
+	Yields lists of lines read from a file object, about block_size bytes at a time
+	"""
+	while True:
+		block = f.readlines(block_size)
+		if not block:
+			return
+		if parse is not None:
+			block = [parse(line) for line in block]
+		yield block
+
+def _merge_blocks(block_iters, key, reverse):
+	if reverse:
+		compare = lambda x,y: x[KEY] < y[KEY] or (x[KEY] == y[KEY] and x[SOURCE] > y[SOURCE])
+	else:
+		compare = lambda x,y: x[KEY] > y[KEY] or (x[KEY] == y[KEY] and x[SOURCE] > y[SOURCE])
+	heap = Heap(compare)
+
+	for idx, blocks in enumerate(block_iters):
+		block = next(blocks, None)
+		if block is not None:
+			item = block[0]
+			heap.push([item if key is None else key(item), idx, item, block, 0, blocks])
+
+	while len(heap) > 1:
+		entry = heap[0]
+		yield entry[ITEM]
+
+		pos = entry[POS] + 1
+		block = entry[BLOCK]
+		if pos == len(block):
+			block = next(entry[BLOCKS], None)
+			if block is None:
+				# Source exhausted
+				heap.pop()
+				continue
+			entry[BLOCK] = block
+			pos = 0
+		item = block[pos]
+		entry[POS] = pos
+		entry[ITEM] = item
+		entry[KEY] = item if key is None else key(item)
+		# The entry was updated in place; replace re-sifts it from the root
+		heap.replace(entry)
+
+	if len(heap) == 1:
+		# Only one source is left, so the rest of it can be passed through
+		entry = heap.pop()
+		block = entry[BLOCK]
+		for i in range(entry[POS], len(block)):
+			yield block[i]
+		for block in entry[BLOCKS]:
+			for item in block:
+				yield item
+
+def merge(*sources, key=None, reverse=False, block_size=1024):
+	"""
+	Merges sorted iterables into a single sorted stream, reading block_size
+	items at a time from each source. If reverse is True the sources must be
+	sorted in descending order.
+	"""
+	return _merge_blocks([_iter_blocks(s, block_size) for s in sources], key, reverse)
+
+def merge_files(paths, parse=None, key=None, reverse=False, block_size=1 << 16):
+	"""
+	Merges sorted text files line by line, reading about block_size bytes at a
+	time from each file. Each line is passed through parse, if given, before it
+	is compared; otherwise lines are yielded as read, newlines included.
+	"""
+	files = [open(path) for path in paths]
+	try:
+		blocks = [_file_blocks(f, block_size, parse) for f in files]
+		for item in _merge_blocks(blocks, key, reverse):
+			yield item
+	finally:
+		for f in files:
+			f.close()
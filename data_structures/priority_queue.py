@@ -0,0 +1,190 @@
+"""
+priority_queue.py
+
+Thread-safe and asyncio priority queues built on top of Heap.
+
+ConcurrentHeap guards a single Heap with one lock that is only held for the
+duration of the underlying heap operation. Consumers may block in pop() until
+an element arrives, and drain(k) removes up to k elements under a single lock
+acquisition so that the locking cost is amortized over the whole batch.
+
+AsyncHeap is the asyncio counterpart. It is not thread-safe; all of its methods
+must be called from the event loop that owns it.
+
+Both classes take the same "comparator" as Heap, so by default they are max
+priority queues. Like Heap.pop, an empty (or timed out) pop returns None.
+"""
+import asyncio
+import collections
+import threading
+from time import monotonic
+from heap import Heap
+
+class ConcurrentHeap:
+	def __init__(self, comparator=lambda x,y: x < y):
+		self._heap = Heap(comparator)
+		self._lock = threading.Lock()
+		self._not_empty = threading.Condition(self._lock)
+		# Number of consumers blocked in _wait. Lets push skip notify() entirely
+		# in the common case where nobody is waiting.
+		self._waiting = 0
+
+	def __len__(self):
+		with self._lock:
+			return len(self._heap)
+
+	def __str__(self):
+		with self._lock:
+			return self._heap.__str__()
+
+	def __repr__(self):
+		return self.__str__()
+
+	def _wait(self, timeout):
+		"""
+		Waits until the heap is non-empty. Must be called with the lock held.
+		Returns False if the timeout expired first.
+		"""
+		if timeout is None:
+			while len(self._heap) == 0:
+				self._waiting += 1
+				try:
+					self._not_empty.wait()
+				finally:
+					self._waiting -= 1
+			return True
+
+		deadline = monotonic() + timeout
+		while len(self._heap) == 0:
+			remaining = deadline - monotonic()
+			if remaining <= 0:
+				return False
+			self._waiting += 1
+			try:
+				self._not_empty.wait(remaining)
+			finally:
+				self._waiting -= 1
+		return True
+
+	def push(self, elm):
+		with self._lock:
+			self._heap.push(elm)
+			if self._waiting:
+				self._not_empty.notify()
+
+	def push_many(self, elms):
+		"""
+		Pushes every element of elms under a single lock acquisition
+		"""
+		with self._lock:
+			for elm in elms:
+				self._heap.push(elm)
+			if self._waiting:
+				self._not_empty.notify(len(self._heap))
+
+	def peek(self):
+		with self._lock:
+			return self._heap.peek()
+
+	def pop(self, block=True, timeout=None):
+		"""
+		Removes and returns the top element. If block is True, waits up to
+		timeout seconds (forever if timeout is None) for an element to arrive.
+		"""
+		with self._lock:
+			if block and not self._wait(timeout):
+				return None
+			return self._heap.pop()
+
+	def drain(self, k=None, block=False, timeout=None):
+		"""
+		Removes and returns up to k elements (all of them if k is None), in
+		priority order, under a single lock acquisition. If block is True, waits
+		as pop does for at least one element to be available.
+		"""
+		with self._lock:
+			if block and not self._wait(timeout):
+				return []
+			heap = self._heap
+			n = len(heap)
+			if k is not None and k < n:
+				n = k
+			return [heap.pop() for i in range(0, n)]
+
+
+class AsyncHeap:
+	def __init__(self, comparator=lambda x,y: x < y):
+		self._heap = Heap(comparator)
+		# Futures of coroutines suspended in get(), in arrival order
+		self._getters = collections.deque()
+
+	def __len__(self):
+		return len(self._heap)
+
+	def __str__(self):
+		return self._heap.__str__()
+
+	def __repr__(self):
+		return self.__str__()
+
+	def _wakeup_next(self):
+		while self._getters:
+			getter = self._getters.popleft()
+			if not getter.done():
+				getter.set_result(None)
+				break
+
+	def put_nowait(self, elm):
+		self._heap.push(elm)
+		self._wakeup_next()
+
+	async def put(self, elm):
+		"""
+		The queue is unbounded, so put never suspends. It is provided so that
+		AsyncHeap can be used wherever an asyncio.Queue is expected.
+		"""
+		self.put_nowait(elm)
+
+	def peek(self):
+		return self._heap.peek()
+
+	def get_nowait(self):
+		return self._heap.pop()
+
+	async def _wait(self):
+		loop = asyncio.get_running_loop()
+		while len(self._heap) == 0:
+			getter = loop.create_future()
+			self._getters.append(getter)
+			try:
+				await getter
+			except:
+				getter.cancel()
+				try:
+					self._getters.remove(getter)
+				except ValueError:
+					pass
+				# We may have been woken up just before being cancelled; pass
+				# the wakeup on so the element is not left unclaimed.
+				if len(self._heap) > 0 and not getter.cancelled():
+					self._wakeup_next()
+				raise
+
+	async def get(self):
+		"""
+		Removes and returns the top element, suspending until one is available
+		"""
+		await self._wait()
+		return self._heap.pop()
+
+	async def drain(self, k=None):
+		"""
+		Waits for at least one element, then removes and returns up to k of
+		them (all of them if k is None) in priority order
+		"""
+		await self._wait()
+		heap = self._heap
+		n = len(heap)
+		if k is not None and k < n:
+			n = k
+		return [heap.pop() for i in range(0, n)]
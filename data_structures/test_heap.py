@@ -1,63 +1,117 @@
+"""
+test_heap.py
+
+Tests for the Heap class. Every test runs on a CheckedHeap, which verifies the
+heap invariant after each mutation, and compares the results against heapq.
+
+To run the tests:
+$ python -m pytest test_heap.py
+"""
 import heapq
-import sys
 import random
-import time
+import sys
+import pytest
 from heap import Heap
+from heap_debug import CheckedHeap, HeapInvariantError, check_invariant
+from heap_keys import DISTRIBUTIONS, keys
 
-size = int(sys.argv[1])
+SIZE = 2000
 
-l = []
-for i in range(size):
-	l.append(random.randint(0,4*size))
-s = [0] * size
+def min_heap():
+	return CheckedHeap(comparator = lambda x,y: x > y)
 
-"""
-# heapq implementation
-t0 = time.clock()
-h = []
-for elm in l:
-	heapq.heappush(h, elm)
-
-for i in range(0, len(l)):
-	s[i] = heapq.heappop(h)
-t1 = time.clock()
-print(t1-t0)
-
-# my Heap implementation
-t0 = time.clock()
-h = Heap()
-for elm in l:
-	h.push(elm)
-
-for i in range(0, len(l)):
-	s[i] = h.pop()
-t1 = time.clock()
-print(t1-t0)
-"""
+def drain(h):
+	return [h.pop() for i in range(0, len(h))]
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_push_pop_sorts(distribution):
+	l = keys(distribution, SIZE)
+	h = min_heap()
+	for x in l:
+		h.push(x)
+	assert len(h) == SIZE
+	assert drain(h) == sorted(l)
+	assert len(h) == 0
 
-def test_heap_invariant(h):
-	for i in range(0, h._size):
-		if 2*i+1 < h._size and h[i] > h[2*i+1]:
-			return False
-		if 2*i+2 < h._size and h[i] > h[2*i+2]:
-			return False
-	return True
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_heapify(distribution):
+	l = keys(distribution, SIZE)
+	h = min_heap()
+	h.heapify(l)
+	assert check_invariant(h)
+	assert drain(h) == sorted(l)
 
-myHeap = Heap(comparator = lambda x,y: x > y)
-for x in l:
-	myHeap.push(x)
-	if random.randint(0,1) == 0:
-		myHeap.pop()
+def test_default_is_max_heap():
+	l = keys('random', SIZE)
+	h = CheckedHeap()
+	h.heapify(l)
+	assert drain(h) == sorted(l, reverse=True)
 
-print(myHeap)
-print(test_heap_invariant(myHeap))
+def test_empty_heap():
+	h = min_heap()
+	assert h.peek() is None
+	assert h.pop() is None
+	assert h.replace(1) is None
+	assert h.pop() == 1
+	assert h.pushpop(2) == 2
+	assert len(h) == 0
 
-s = []
-length = myHeap._size
-for i in range(0, length):
-	s.append(myHeap.pop())
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_delete(distribution):
+	rng = random.Random(1)
+	l = keys(distribution, SIZE)
+	h = min_heap()
+	h.heapify(l)
+	remaining = list(l)
+	for i in range(0, SIZE // 2):
+		idx = rng.randrange(0, len(h))
+		remaining.remove(h[idx])
+		h.delete(idx)
+	h.delete(-1)
+	h.delete(len(h))
+	assert drain(h) == sorted(remaining)
 
-print(s)
+def test_replace_and_pushpop_match_heapq():
+	rng = random.Random(2)
+	h = min_heap()
+	ref = []
+	for x in keys('random', 100, seed=3):
+		h.push(x)
+		heapq.heappush(ref, x)
+	for i in range(0, SIZE):
+		x = rng.random()
+		if i % 2 == 0:
+			assert h.replace(x) == heapq.heapreplace(ref, x)
+		else:
+			assert h.pushpop(x) == heapq.heappushpop(ref, x)
+	assert drain(h) == sorted(ref)
 
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_mixed_operations_match_heapq(distribution):
+	rng = random.Random(4)
+	h = min_heap()
+	ref = []
+	for x in keys(distribution, SIZE):
+		h.push(x)
+		heapq.heappush(ref, x)
+		if rng.randint(0, 1) == 0:
+			assert h.pop() == heapq.heappop(ref)
+		assert h.peek() == (ref[0] if ref else None)
+	assert drain(h) == sorted(ref)
 
+def test_checked_heap_detects_corruption():
+	h = min_heap()
+	h.heapify(range(0, 10))
+	h[0] = 100
+	with pytest.raises(HeapInvariantError):
+		h.push(5)
 
+def test_plain_heap_shrinks_with_pops():
+	h = Heap()
+	h.heapify(range(0, SIZE))
+	full = sys.getsizeof(h._array)
+	for i in range(0, SIZE - 1):
+		h.pop()
+	assert len(h) == 1
+	# The list gives memory back as it empties
+	assert sys.getsizeof(h._array) < full // 10
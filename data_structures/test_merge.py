@@ -0,0 +1,40 @@
+"""
+test_merge.py
+
+Tests for the k-way merge, checked against sorting all runs together.
+
+To run the tests:
+$ python -m pytest test_merge.py
+"""
+import pytest
+from merge import merge, merge_files
+from heap_keys import DISTRIBUTIONS, keys
+
+def runs(distribution, count, size):
+	return [sorted(keys(distribution, size, seed=i)) for i in range(0, count)]
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+@pytest.mark.parametrize('block_size', [1, 7, 1024])
+def test_merge_matches_sorted(distribution, block_size):
+	r = runs(distribution, 5, 300)
+	assert list(merge(*r, block_size=block_size)) == sorted(sum(r, []))
+
+def test_merge_reverse_and_empty_runs():
+	r = [sorted(run, reverse=True) for run in runs('random', 4, 100)] + [[]]
+	assert list(merge(*r, reverse=True, block_size=8)) == sorted(sum(r, []), reverse=True)
+	assert list(merge()) == []
+
+def test_merge_is_stable():
+	# Items compare by their first field only; ties come out in source order
+	r = [[(x, i) for x in sorted(keys('duplicates', 200, seed=i))] for i in range(0, 3)]
+	merged = list(merge(*r, key=lambda pair: pair[0], block_size=16))
+	assert merged == sorted(sum(r, []), key=lambda pair: pair[0])
+
+def test_merge_files(tmp_path):
+	r = runs('random', 3, 200)
+	paths = []
+	for i, run in enumerate(r):
+		path = tmp_path / 'run{}.txt'.format(i)
+		path.write_text(''.join('{!r}\n'.format(x) for x in run))
+		paths.append(str(path))
+	assert list(merge_files(paths, parse=float, block_size=64)) == sorted(sum(r, []))
@@ -0,0 +1,63 @@
+"""
+test_priority_queue.py
+
+Tests for ConcurrentHeap and AsyncHeap.
+
+To run the tests:
+$ python -m pytest test_priority_queue.py
+"""
+import asyncio
+import threading
+from priority_queue import ConcurrentHeap, AsyncHeap
+from heap_keys import keys
+
+SIZE = 2000
+
+def test_concurrent_producers_and_consumers():
+	q = ConcurrentHeap()
+	l = keys('random', SIZE)
+	popped = []
+	lock = threading.Lock()
+
+	def consume():
+		while True:
+			x = q.pop(timeout=5.0)
+			if x is None or x < 0:
+				return
+			with lock:
+				popped.append(x)
+
+	consumers = [threading.Thread(target=consume) for i in range(0, 4)]
+	producers = [threading.Thread(target=q.push_many, args=(l[i::4],)) for i in range(0, 4)]
+	for thread in consumers + producers:
+		thread.start()
+	for thread in producers:
+		thread.join()
+	# One stop marker per consumer, below every key
+	q.push_many([-1.0]*4)
+	for thread in consumers:
+		thread.join()
+	assert sorted(popped) == sorted(l)
+
+def test_drain_and_timeout():
+	q = ConcurrentHeap()
+	assert q.pop(timeout=0.01) is None
+	assert q.drain(block=True, timeout=0.01) == []
+	q.push_many(range(0, 10))
+	assert q.drain(3) == [9, 8, 7]
+	assert q.drain() == list(range(6, -1, -1))
+
+def test_async_get_waits_for_put():
+	async def main():
+		q = AsyncHeap(comparator = lambda x,y: x > y)
+		getter = asyncio.ensure_future(q.get())
+		await asyncio.sleep(0)
+		assert not getter.done()
+		for x in [5, 1, 3]:
+			await q.put(x)
+		# put does not suspend, so the getter runs after all three puts
+		first = await getter
+		return first, await q.drain()
+	first, rest = asyncio.run(main())
+	assert first == 1
+	assert rest == [3, 5]
@@ -0,0 +1,74 @@
+"""
+test_topk.py
+
+Tests for TopK, checked against sorting the whole stream.
+
+To run the tests:
+$ python -m pytest test_topk.py
+"""
+import pickle
+import numpy as np
+import pytest
+from topk import TopK
+from heap_keys import DISTRIBUTIONS, keys
+
+SIZE = 2000
+
+def expected(l, k, largest):
+	return sorted(l, reverse=largest)[0:k]
+
+def scores(t):
+	return [score for score, item in t.results()]
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+@pytest.mark.parametrize('largest', [True, False])
+@pytest.mark.parametrize('k', [1, 10, SIZE + 5])
+def test_push_matches_sorted(distribution, largest, k):
+	l = keys(distribution, SIZE)
+	t = TopK(k, largest=largest)
+	for x in l:
+		t.push(x)
+	assert t.items() == expected(l, k, largest)
+
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+@pytest.mark.parametrize('largest', [True, False])
+def test_push_many_from_iterator(distribution, largest):
+	l = keys(distribution, SIZE)
+	t = TopK(25, largest=largest)
+	t.push_many(iter(l[0:SIZE//2]))
+	t.push_many(x for x in l[SIZE//2:])
+	assert t.items() == expected(l, 25, largest)
+
+def test_key():
+	l = keys('random', SIZE)
+	t = TopK(10, key=lambda x: -x)
+	t.push_many(l)
+	assert t.items() == sorted(l)[0:10]
+
+@pytest.mark.parametrize('largest', [True, False])
+def test_push_array_in_chunks(largest):
+	a = np.array(keys('random', SIZE, seed=4))
+	t = TopK(30, largest=largest)
+	for start in range(0, SIZE, 300):
+		t.push_array(a[start:start+300], offset=start)
+	best = expected(a.tolist(), 30, largest)
+	assert scores(t) == best
+	assert [a[i] for i in t.items()] == best
+
+def test_pickle_and_merged():
+	l = keys('random', SIZE, seed=5)
+	parts = []
+	for start in range(0, SIZE, 500):
+		part = TopK(15)
+		part.push_many(l[start:start+500])
+		parts.append(pickle.loads(pickle.dumps(part)))
+	assert TopK.merged(parts).items() == expected(l, 15, True)
+
+def test_k_zero_keeps_nothing():
+	t = TopK(0)
+	assert not t.push(1.0)
+	t.push_many([1.0, 2.0])
+	t.push_array(np.array([3.0, 4.0]))
+	assert len(t) == 0
+	assert t.threshold() is None
+	assert t.items() == []
@@ -0,0 +1,188 @@
+"""
+topk.py
+
+Implementation of TopK, a bounded selector that keeps the best k items seen in
+a stream.
+
+Items are kept in a Heap of (score, item) pairs whose root is the worst item
+currently kept. Once k items are held, a new item only needs a single
+comparison against the root to be rejected; an item that beats the root
+replaces it in place, so memory stays O(k) no matter how long the stream is.
+
+By default the k largest scores are kept. Pass largest=False to keep the k
+smallest instead. The score of an item is key(item), or the item itself if no
+key is given.
+
+TopK objects can be pickled as long as their key is, so partial results from
+worker processes can be sent back and combined with merge() or TopK.merged().
+"""
+from heap import Heap
+
+class TopK:
+	def __init__(self, k, key=None, largest=True):
+		self.k = k
+		self.key = key
+		self.largest = largest
+		self._heap = self._new_heap()
+
+	def _new_heap(self):
+		# The root must hold the worst kept item, i.e. a min heap on score when
+		# keeping the largest items and a max heap when keeping the smallest.
+		if self.largest:
+			return Heap(comparator = lambda x,y: x[0] > y[0])
+		return Heap(comparator = lambda x,y: x[0] < y[0])
+
+	def __len__(self):
+		return len(self._heap)
+
+	def __str__(self):
+		return self.results().__str__()
+
+	def __repr__(self):
+		return self.__str__()
+
+	def __getstate__(self):
+		# The heap comparator is a lambda and cannot be pickled, so only the
+		# kept entries are sent; the heap is rebuilt on the other side.
+		return {'k': self.k, 'key': self.key, 'largest': self.largest,
+			'entries': self._heap[0:len(self._heap)]}
+
+	def __setstate__(self, state):
+		self.k = state['k']
+		self.key = state['key']
+		self.largest = state['largest']
+		self._heap = self._new_heap()
+		for entry in state['entries']:
+			self._heap.push(entry)
+
+	def threshold(self):
+		"""
+		Returns the score an item has to beat to be kept, or None while fewer
+		than k items have been seen
+		"""
+		if len(self._heap) < self.k or self.k < 1:
+			return None
+		return self._heap[0][0]
+
+	def _offer(self, score, item):
+		heap = self._heap
+		if self.k < 1:
+			return False
+		if len(heap) < self.k:
+			heap.push((score, item))
+			return True
+		if (score > heap[0][0]) if self.largest else (score < heap[0][0]):
+			heap.replace((score, item))
+			return True
+		return False
+
+	def push(self, item):
+		"""
+		Offers one item. Returns True if it is (for now) among the best k.
+		"""
+		if self.key is None:
+			return self._offer(item, item)
+		return self._offer(self.key(item), item)
+
+	def push_many(self, items):
+		"""
+		Offers every item of an iterable
+		"""
+		key = self.key
+		heap = self._heap
+		k = self.k
+		largest = self.largest
+
+		it = iter(items)
+		# Fill phase: every item is kept until there are k of them
+		if len(heap) < k:
+			for item in it:
+				heap.push((item if key is None else key(item), item))
+				if len(heap) >= k:
+					break
+		if len(heap) == 0:
+			return
+
+		# Steady state: one comparison against the root per rejected item
+		root = heap[0][0]
+		for item in it:
+			score = item if key is None else key(item)
+			if (score > root) if largest else (score < root):
+				heap.replace((score, item))
+				root = heap[0][0]
+
+	def push_array(self, scores, items=None, offset=0):
+		"""
+		Offers a chunk of a stream held in a NumPy array of scores. The item
+		stored with scores[i] is items[i] if items is given, and otherwise the
+		position offset+i of the score in the overall stream.
+
+		Scores that cannot beat the current threshold are discarded with one
+		vectorized comparison, and at most k survivors of the chunk are pushed
+		one by one.
+		"""
+		import numpy as np
+
+		if self.k < 1:
+			return
+		scores = np.asarray(scores)
+		idx = np.arange(scores.shape[0])
+		threshold = self.threshold()
+		if threshold is not None:
+			if self.largest:
+				idx = idx[scores > threshold]
+			else:
+				idx = idx[scores < threshold]
+		if idx.shape[0] > self.k:
+			if self.largest:
+				best = np.argpartition(scores[idx], -self.k)[-self.k:]
+			else:
+				best = np.argpartition(scores[idx], self.k-1)[:self.k]
+			idx = idx[best]
+
+		for i in idx.tolist():
+			score = scores[i].item()
+			if items is None:
+				self._offer(score, offset + i)
+			else:
+				self._offer(score, items[i])
+
+	def merge(self, other):
+		"""
+		Merges the items kept by another TopK (or any iterable of (score, item)
+		pairs) into this one
+		"""
+		if isinstance(other, TopK):
+			if other.largest != self.largest:
+				print("ERROR: Cannot merge TopK selectors with different orderings")
+				return
+			other = other._heap[0:len(other._heap)]
+		for score, item in other:
+			self._offer(score, item)
+
+	@classmethod
+	def merged(cls, parts):
+		"""
+		Combines the partial results of several TopK selectors, for example one
+		per worker process, into a single TopK
+		"""
+		result = None
+		for part in parts:
+			if result is None:
+				result = cls(part.k, part.key, part.largest)
+			result.merge(part)
+		return result
+
+	def results(self):
+		"""
+		Returns the kept (score, item) pairs, best first
+		"""
+		entries = self._heap[0:len(self._heap)]
+		entries.sort(key=lambda entry: entry[0], reverse=self.largest)
+		return entries
+
+	def items(self):
+		"""
+		Returns the kept items, best first
+		"""
+		return [item for score, item in self.results()]
@@ -0,0 +1,37 @@
+"""
+benchmark.py
+
+Speed of the matrix product in GFLOP/s, with NumPy's BLAS and with the pure
+Python kernel, for square matrices of sizes 64 to 2048. The pure Python kernel
+is only timed up to PYTHON_MAX.
+"""
+
+import time
+import numpy as np
+from matrix import Matrix, matmul
+
+SIZES = [64, 128, 256, 512, 1024, 2048]
+PYTHON_MAX = 512
+
+def best_time(f, repeats):
+	best = None
+	for r in range(0, repeats):
+		start = time.perf_counter()
+		f()
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+print("{:>6} {:>12} {:>12}".format("n", "BLAS", "Python"))
+for n in SIZES:
+	A = Matrix(n, n, np.random.rand(n, n))
+	B = Matrix(n, n, np.random.rand(n, n))
+	C = Matrix(n, n)
+	flops = 2.0 * n**3
+
+	blas = flops / best_time(lambda: matmul(A, B, out=C), 5) / 1e9
+	python = "-"
+	if n <= PYTHON_MAX:
+		python = "{:.3f}".format(flops / best_time(lambda: matmul(A, B, out=C, blas=False), 1) / 1e9)
+	print("{:>6} {:>12.3f} {:>12}".format(n, blas, python))
@@ -4,7 +4,7 @@ main.py
 Full matrix solver tester
 """
 
-from matrix import Matrix, TridiagMatrix
+from matrix import Matrix, TridiagMatrix, BandedMatrix, LUFactorization
 
 A = Matrix(4,4)
 B = Matrix(4,2) 
@@ -13,8 +13,8 @@ X = Matrix(4,2)
 for i in range(0, 4):
 	for j in range(0, 4):
 		A[i,j] = 0.01*i*i+0.02*j
-  	A[i,i] += 3.0+0.3*i;
-  	for j in range(0,2):
+	A[i,i] += 3.0+0.3*i;
+	for j in range(0,2):
 		X[i,j] = i+1.0+4.0*j
 
 print("Test of full matrix\nThe results should be:")
@@ -48,3 +48,49 @@ X = TridiagMatrix.solve(C,B);
 
 print("The results are:")
 print(X)
+
+
+print("\nTest of banded matrix\nThe results should be:")
+X = Matrix(6,2)
+for i in range(0,6):
+	for j in range(0,2):
+		X[i,j] = i+1.0+6.0*j
+print(X)
+
+D = BandedMatrix(6, 2, 2)
+
+for i in range(0,6):
+	for j in range(max(0,i-2), min(6,i+3)):
+		D[i,j] = 0.1*(i+1) - 0.05*j*j
+	D[i,i] += 0.5
+
+B = D*X;
+D.factor();
+X = BandedMatrix.solve(D,B);
+
+print("The results are:")
+print(X)
+
+
+print("\nTest of LU factorization with pivoting\nThe results should be:")
+X = Matrix(4,2)
+for i in range(0,4):
+	for j in range(0,2):
+		X[i,j] = i+1.0+4.0*j
+print(X)
+
+# Zero in the first pivot position, which factor() cannot handle
+A = Matrix(4,4)
+for i in range(0,4):
+	for j in range(0,4):
+		A[i,j] = 0.01*i*i+0.02*j
+	A[i,i] += 3.0+0.3*i
+A[0,0] = 0.0
+
+B = A*X;
+LU = LUFactorization(A);
+X = LU.solve(B);
+
+print("The results are:")
+print(X)
+print("Determinant: {}, condition number estimate: {}".format(LU.det(), LU.cond()))
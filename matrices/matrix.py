@@ -2,23 +2,110 @@
 matrix.py
 
 Implementation of matrix operations.
-Implements two classes: Matrix and TridiagMatrix
+Implements three classes: Matrix, TridiagMatrix and BandedMatrix, and the
+LUFactorization of a Matrix
 """
 import sys
+from array import array
+from operator import mul
+import numpy as np
+
+# Block size of the pure Python matrix product
+BLOCK = 64
+# Block size of LUFactorization
+LU_BLOCK = 64
+
+def matmul(A, B, out = None, blas = True):
+	"""
+	Matrix product A*B, written into the Matrix out if given (which is also
+	returned). With blas=True the product is computed by NumPy, i.e. by the BLAS
+	dgemm it is linked against; otherwise by a blocked pure Python kernel.
+	"""
+	if A.cols != B.rows:
+		print("ERROR: Incompatible sizes for matrix multiplication")
+		return
+	if out is None:
+		out = Matrix(A.rows, B.cols)
+	elif out.rows != A.rows or out.cols != B.cols:
+		print("ERROR: Incompatible size of the result of matrix multiplication")
+		return
+
+	c = out.matrix
+	# Products that overlap an operand or go into a strided view are computed
+	# separately and copied
+	direct = c.flags.c_contiguous and not (np.shares_memory(c, A.matrix) or np.shares_memory(c, B.matrix))
+	if blas:
+		if direct:
+			np.dot(A.matrix, B.matrix, out=c)
+		else:
+			c[...] = np.dot(A.matrix, B.matrix)
+	else:
+		product = _matmul_blocked(A.matrix, B.matrix)
+		c[...] = product
+	return out
+
+def _matmul_blocked(a, b):
+	"""
+	Pure Python product of two arrays. Each entry is the sum of products of a row
+	of a and a row of the transpose of b, taken over blocks of BLOCK rows of
+	each, so that the rows of the block of b stay in cache while the rows of a
+	are run over.
+	"""
+	rows = a.tolist()
+	bt = b.T.tolist()
+	m = len(rows)
+	n = len(bt)
+	result = [[0.0]*n for i in range(0, m)]
+	for i0 in range(0, m, BLOCK):
+		for j0 in range(0, n, BLOCK):
+			block = bt[j0:j0+BLOCK]
+			for i in range(i0, min(i0+BLOCK, m)):
+				row = rows[i]
+				result[i][j0:j0+BLOCK] = [sum(map(mul, row, col)) for col in block]
+	return result
 
 class Matrix:
-	def __init__(self, rows, cols):
+	"""
+	Dense matrix stored in a contiguous 2-D float64 NumPy array, self.matrix.
+	Arithmetic works on the whole array at once. row, col and submatrix return
+	Matrix views that share the storage of the original, so writing to a view
+	writes to the matrix.
+	"""
+	def __init__(self, rows, cols, data = None):
 		self.rows = rows
 		self.cols = cols
-		self.matrix = []
-		for i in range(0, rows):
-			self.matrix.append([0.0]*cols)
+		if data is None:
+			self.matrix = np.zeros((rows, cols))
+		else:
+			# Wrap data without copying it
+			if data.shape != (rows, cols):
+				print("ERROR: Matrix data has shape {}, expected {}".format(data.shape, (rows, cols)))
+				return
+			self.matrix = data
 
 	def __getitem__(self, loc):
-		return self.matrix[loc[0]][loc[1]]
+		return self.matrix[loc]
 
 	def __setitem__(self, loc, value):
-		self.matrix[loc[0]][loc[1]] = value
+		self.matrix[loc] = value
+
+	def row(self, i):
+		return Matrix(1, self.cols, self.matrix[i:i+1, :])
+
+	def col(self, j):
+		return Matrix(self.rows, 1, self.matrix[:, j:j+1])
+
+	def submatrix(self, r0, r1, c0, c1):
+		"""
+		View of rows r0 to r1-1 and columns c0 to c1-1
+		"""
+		if not (0 <= r0 <= r1 <= self.rows and 0 <= c0 <= c1 <= self.cols):
+			print("ERROR: Submatrix out of range")
+			return
+		return Matrix(r1 - r0, c1 - c0, self.matrix[r0:r1, c0:c1])
+
+	def copy(self):
+		return Matrix(self.rows, self.cols, self.matrix.copy())
 
 	def __mul__(self, other):
 		if isinstance(other, Matrix):
@@ -28,73 +115,73 @@ class Matrix:
 			if self.cols != other.rows:
 				print("ERROR: Incompatible sizes for matrix multiplication")
 				return
-			result = Matrix(self.rows, other.cols)
-			for i in range(0, self.rows):
-				for j in range(0, other.cols):
-					for k in range(0, self.cols):
-						result[i,j] += self[i,k] * other[k,j]
-			return result
+			return matmul(self, other)
 		else:
 			"""
 			Right Scalar multiplication
 			"""
-			result = Matrix(self.rows, self.cols)
-			for i in range(0, self.rows):
-				for j in range(0, self.cols):
-					result[i,j] = self[i,j] * other
-			return result
+			return Matrix(self.rows, self.cols, self.matrix * other)
 
 	def __rmul__(self, other):
 		"""
 		Left Scalar multiplication
 		"""
-		result = Matrix(self.rows, self.cols)
-		for i in range(0, self.rows):
-			for j in range(0, self.cols):
-				result[i,j] = self[i,j] * other
-		return result
+		return Matrix(self.rows, self.cols, other * self.matrix)
+
+	def __imul__(self, other):
+		if isinstance(other, Matrix):
+			return NotImplemented
+		self.matrix *= other
+		return self
 
 	def __add__(self, other):
 		if self.rows != other.rows or self.cols != other.cols:
 			print("ERROR: Incompatible sizes for matrix addition")
 			return
-		result = Matrix(self.rows, self.cols)
-		for i in range(0, self.rows):
-			for j in range(0, self.cols):
-				result[i,j] = self[i,j] + other[i,j]
-		return result
+		return Matrix(self.rows, self.cols, self.matrix + other.matrix)
+
+	def __iadd__(self, other):
+		if self.rows != other.rows or self.cols != other.cols:
+			print("ERROR: Incompatible sizes for matrix addition")
+			return self
+		self.matrix += other.matrix
+		return self
 
 	def __sub__(self, other):
 		if self.rows != other.rows or self.cols != other.cols:
 			print("ERROR: Incompatible sizes for matrix subtraction")
 			return
-		result = Matrix(self.rows, self.cols)
-		for i in range(0, self.rows):
-			for j in range(0, self.cols):
-				result[i,j] = self[i,j] - other[i,j]
-		return result
+		return Matrix(self.rows, self.cols, self.matrix - other.matrix)
+
+	def __isub__(self, other):
+		if self.rows != other.rows or self.cols != other.cols:
+			print("ERROR: Incompatible sizes for matrix subtraction")
+			return self
+		self.matrix -= other.matrix
+		return self
+
+	def __neg__(self):
+		return Matrix(self.rows, self.cols, -self.matrix)
 
 	def __repr__(self):
-		representation = self.matrix[0].__repr__()
+		representation = self.matrix[0].tolist().__repr__()
 		for i in range(1, self.rows):
-			representation += "\n" + self.matrix[i].__repr__()
+			representation += "\n" + self.matrix[i].tolist().__repr__()
 		return representation
 
 	def factor(self):
 		if self.rows != self.cols:
 			print("ERROR: Incompatible size for matrix factorization")
 			return
+		a = self.matrix
 		for i in range(0, self.rows):
 			# Modify the ith row
-			self[i,i] = 1.0 / self[i,i]
-			for j in range(i+1, self.cols):
-				self[i,j] = self[i,j] * self[i,i]
+			a[i,i] = 1.0 / a[i,i]
+			a[i,i+1:] *= a[i,i]
 
 			# Modify the rest of the subsequent rows
-			for k in range(i+1, self.cols):
-				self[k, i] = -self[k,i]
-				for j in range(i+1, self.cols):
-					self[k,j] = self[k,j] + self[k,i]*self[i,j] 
+			a[i+1:,i] = -a[i+1:,i]
+			a[i+1:,i+1:] += np.outer(a[i+1:,i], a[i,i+1:])
 
 	def solve(A, B):
 		"""
@@ -106,34 +193,179 @@ class Matrix:
 		if A.cols != B.rows:
 			print("ERROR: Incompatible sizes for matrix solving")
 			return
-		
+
+		a = A.matrix
 		result = Matrix(B.rows, B.cols)
-		
+		x = result.matrix
+
 		# Compute the matrix L^-1 * B, where A = LU, U upper triangular
-		L1B = Matrix(B.rows, B.cols)
-		for i in range(0, B.rows):
-			for j in range(0, B.cols):
-				L1B[i,j] = B[i,j]
+		L1B = B.matrix.copy()
 		for i in range(0, B.rows):
 			# Multiply by L_d
-			for j in range(0, B.cols):
-				L1B[i,j] = A[i,i] * L1B[i,j]
+			L1B[i] *= a[i,i]
 			# Multiply by L_c
-			for k in range(i+1, B.rows):
-				for j in range(0, B.cols):
-					L1B[k,j] = L1B[k,j] + A[k,i]*L1B[i,j]
+			L1B[i+1:] += np.outer(a[i+1:,i], L1B[i])
 
 		# Solve the equation UX = L1B
 		for i in range(B.rows-1, -1, -1):
-			for k in range(0, B.cols):
-				temp = 0
-				for j in range(i+1, A.cols):
-					temp += A[i,j] * result[j,k]
-				result[i,k] = L1B[i,k] - temp
+			x[i] = L1B[i] - np.dot(a[i,i+1:], x[i+1:])
 
 		return result
 
 
+class LUFactorization:
+	"""
+	LU factorization with partial pivoting, A[perm] = L U, of a square Matrix A,
+	with L unit lower triangular and U upper triangular stored together in
+	self.lu. A itself is not modified, and the factorization can be used for any
+	number of solves.
+
+	The factorization is right-looking and blocked: a panel of LU_BLOCK columns is
+	factored with row interchanges, and the rest of the matrix is updated with
+	one matrix product per panel, where most of the work is done.
+	"""
+	def __init__(self, A, block = LU_BLOCK):
+		if A.rows != A.cols:
+			print("ERROR: Incompatible size for matrix factorization")
+			return
+		n = A.rows
+		self.n = n
+		self.lu = np.array(A.matrix, dtype=np.float64)
+		self.perm = np.arange(n)
+		self.sign = 1
+		self.singular = False
+		# 1-norm of A, for the condition estimate
+		self.anorm = np.abs(self.lu).sum(axis=0).max() if n > 0 else 0.0
+
+		a = self.lu
+		for k0 in range(0, n, block):
+			k1 = min(k0 + block, n)
+
+			# Factor the panel of columns k0 to k1-1
+			for j in range(k0, k1):
+				p = j + np.argmax(np.abs(a[j:, j]))
+				if a[p, j] == 0.0:
+					self.singular = True
+					continue
+				if p != j:
+					a[[j, p]] = a[[p, j]]
+					self.perm[[j, p]] = self.perm[[p, j]]
+					self.sign = -self.sign
+				a[j+1:, j] /= a[j, j]
+				a[j+1:, j+1:k1] -= np.outer(a[j+1:, j], a[j, j+1:k1])
+
+			if k1 < n:
+				# Rows of U to the right of the panel, then the trailing matrix
+				_lower_solve(a[k0:k1, k0:k1], a[k0:k1, k1:], True)
+				a[k1:, k1:] -= np.dot(a[k1:, k0:k1], a[k0:k1, k1:])
+
+	def solve(self, B, out = None):
+		"""
+		Solves A X = B for all columns of the Matrix B. The solution is written
+		into the Matrix out if given, and returned.
+		"""
+		if self.singular:
+			print("ERROR: Matrix is singular")
+			return
+		if B.rows != self.n:
+			print("ERROR: Incompatible sizes for matrix solving")
+			return
+		if out is None:
+			out = Matrix(B.rows, B.cols)
+		elif out.rows != B.rows or out.cols != B.cols:
+			print("ERROR: Incompatible size of the solution")
+			return
+		x = B.matrix[self.perm]
+		_lower_solve(self.lu, x, True)
+		_upper_solve(self.lu, x, False)
+		out.matrix[...] = x
+		return out
+
+	def _solve_transposed(self, b):
+		"""
+		Solution of A^T x = b for an array b
+		"""
+		x = np.empty_like(b)
+		z = np.array(b, dtype=np.float64)
+		_lower_solve(self.lu.T, z, False)
+		_upper_solve(self.lu.T, z, True)
+		x[self.perm] = z
+		return x
+
+	def det(self):
+		if self.singular:
+			return 0.0
+		return self.sign * np.prod(np.diag(self.lu))
+
+	def cond(self):
+		"""
+		Estimate of the condition number ||A|| ||A^-1|| in the 1-norm, with
+		||A^-1|| estimated from a few solves by the method of Hager and Higham
+		(the one used by LAPACK's dgecon), without forming A^-1
+		"""
+		if self.singular:
+			return np.inf
+		n = self.n
+		if n == 0:
+			return 0.0
+
+		def solve(b):
+			x = b[self.perm]
+			_lower_solve(self.lu, x, True)
+			_upper_solve(self.lu, x, False)
+			return x
+
+		x = np.full(n, 1.0 / n)
+		estimate = 0.0
+		for iteration in range(0, 5):
+			y = solve(x)
+			new_estimate = np.abs(y).sum()
+			if iteration > 0 and new_estimate <= estimate:
+				break
+			estimate = new_estimate
+			z = self._solve_transposed(np.where(y >= 0.0, 1.0, -1.0))
+			j = np.argmax(np.abs(z))
+			if iteration > 0 and np.abs(z[j]) <= np.dot(z, x):
+				break
+			x = np.zeros(n)
+			x[j] = 1.0
+
+		# Alternative estimate that catches the cases where the iteration fails
+		alternating = (1.0 + np.arange(n) / max(n - 1, 1)) * np.where(np.arange(n) % 2 == 0, 1.0, -1.0)
+		estimate = max(estimate, 2.0 * np.abs(solve(alternating)).sum() / (3.0 * n))
+		return self.anorm * estimate
+
+def _lower_solve(t, x, unit):
+	"""
+	Overwrites x with the solution of T X = x, for the lower triangle of the
+	array t, with ones on the diagonal if unit
+	"""
+	n = t.shape[0]
+	for k0 in range(0, n, LU_BLOCK):
+		k1 = min(k0 + LU_BLOCK, n)
+		for i in range(k0, k1):
+			x[i] -= np.dot(t[i, k0:i], x[k0:i])
+			if not unit:
+				x[i] /= t[i, i]
+		if k1 < n:
+			x[k1:] -= np.dot(t[k1:, k0:k1], x[k0:k1])
+
+def _upper_solve(t, x, unit):
+	"""
+	Overwrites x with the solution of T X = x, for the upper triangle of the
+	array t, with ones on the diagonal if unit
+	"""
+	n = t.shape[0]
+	for k1 in range(n, 0, -LU_BLOCK):
+		k0 = max(k1 - LU_BLOCK, 0)
+		for i in range(k1 - 1, k0 - 1, -1):
+			x[i] -= np.dot(t[i, i+1:k1], x[i+1:k1])
+			if not unit:
+				x[i] /= t[i, i]
+		if k0 > 0:
+			x[:k0] -= np.dot(t[:k0, k0:k1], x[k0:k1])
+
+
 class TridiagMatrix:
 	def __init__(self, r, bv, dv, av):
 		self.rows = r
@@ -251,6 +483,190 @@ class TridiagMatrix:
 		return result
 
 
+class BandedMatrix:
+	"""
+	Square matrix with lower bandwidth kl and upper bandwidth ku, i.e. A[i,j] = 0
+	unless -ku <= i-j <= kl, in the compact band storage of LAPACK: column j is
+	stored contiguously in a typed array of doubles, with A[i,j] at offset
+	kl+ku+i-j of the column. The extra kl entries at the top of each column hold
+	the fill-in of the upper triangle caused by row interchanges.
+
+	factor() computes A = PLU in place with partial pivoting in O(n*kl*(kl+ku))
+	operations, after which solve can be called any number of times.
+	"""
+	def __init__(self, r, kl, ku):
+		self.rows = r
+		self.kl = kl
+		self.ku = ku
+		self.ldab = 2*kl + ku + 1
+		self.matrix = array('d', [0.0]) * (self.ldab * r)
+		self.piv = None
+
+	def _index(self, i, j):
+		return j*self.ldab + self.kl + self.ku + i - j
+
+	def __getitem__(self, loc):
+		if loc[0] >= self.rows or loc[1] >= self.rows:
+			print("ERROR: BandedMatrix index out of range")
+			return
+		if loc[0] - loc[1] > self.kl or loc[1] - loc[0] > self.kl + self.ku:
+			return 0.0
+		return self.matrix[self._index(loc[0], loc[1])]
+
+	def __setitem__(self, loc, value):
+		if loc[0] >= self.rows or loc[1] >= self.rows:
+			print("ERROR: BandedMatrix index out of range")
+			return
+		if loc[0] - loc[1] > self.kl or loc[1] - loc[0] > self.ku:
+			print("ERROR: Cannot modify entries outside the band of BandedMatrix: {} {}".format(loc[0], loc[1]))
+			return
+		self.matrix[self._index(loc[0], loc[1])] = value
+
+	def __repr__(self):
+		result = ''
+		for i in range(0, self.rows):
+			if i > 0:
+				result += '\n'
+			result += '['
+			for j in range(0, self.rows):
+				result += '{}, '.format(self[i,j])
+			result += ']'
+		return result
+
+	def matvec(self, x):
+		"""
+		Returns A x for a sequence x of length n, as an array of doubles
+		"""
+		n = self.rows
+		kl = self.kl
+		ku = self.ku
+		ab = self.matrix
+		y = array('d', [0.0]) * n
+		for j in range(0, n):
+			xj = x[j]
+			if xj == 0.0:
+				continue
+			base = self._index(0, j)
+			for i in range(max(0, j-ku), min(n, j+kl+1)):
+				y[i] += ab[base + i] * xj
+		return y
+
+	def __mul__(self, other):
+		if isinstance(other, Matrix):
+			if self.rows != other.rows:
+				print("ERROR: Incompatible sizes for matrix multiplication")
+				return
+			result = Matrix(other.rows, other.cols)
+			for j in range(0, other.cols):
+				result.matrix[:, j] = self.matvec(other.matrix[:, j].tolist())
+		else:
+			result = BandedMatrix(self.rows, self.kl, self.ku)
+			for k in range(0, len(self.matrix)):
+				result.matrix[k] = self.matrix[k] * other
+		return result
+
+	def factor(self):
+		n = self.rows
+		kl = self.kl
+		kv = self.kl + self.ku
+		ldab = self.ldab
+		ab = self.matrix
+		# Set as self.piv only once the factorization has succeeded
+		piv = array('l', [0]) * n
+		self.piv = None
+
+		# Last column touched by the row interchanges so far
+		ju = 0
+		for j in range(0, n):
+			km = min(kl, n-1-j)
+			diag = j*ldab + kv
+
+			# Pivot: entry of largest magnitude on or below the diagonal
+			p = 0
+			big = abs(ab[diag])
+			for i in range(1, km+1):
+				if abs(ab[diag + i]) > big:
+					big = abs(ab[diag + i])
+					p = i
+			piv[j] = j + p
+			if big == 0.0:
+				print("ERROR: BandedMatrix is singular")
+				return
+			ju = max(ju, min(j + self.ku + p, n-1))
+
+			# Interchange rows j and j+p in columns j to ju
+			if p != 0:
+				for c in range(j, ju+1):
+					a = c*ldab + kv + j - c
+					ab[a], ab[a + p] = ab[a + p], ab[a]
+
+			# Multipliers, stored in place of the eliminated entries
+			pivot = ab[diag]
+			for i in range(1, km+1):
+				ab[diag + i] /= pivot
+
+			# Update the rest of the band
+			for c in range(j+1, ju+1):
+				a = c*ldab + kv + j - c
+				u = ab[a]
+				if u == 0.0:
+					continue
+				for i in range(1, km+1):
+					ab[a + i] -= ab[diag + i] * u
+		self.piv = piv
+
+	def _solve_column(self, b):
+		"""
+		Overwrites the array b with the solution of A x = b, using the factors
+		"""
+		n = self.rows
+		kl = self.kl
+		kv = self.kl + self.ku
+		ldab = self.ldab
+		ab = self.matrix
+		piv = self.piv
+
+		# Solve L y = P b
+		for j in range(0, n-1):
+			l = piv[j]
+			if l != j:
+				b[l], b[j] = b[j], b[l]
+			bj = b[j]
+			if bj == 0.0:
+				continue
+			diag = j*ldab + kv
+			for i in range(1, min(kl, n-1-j)+1):
+				b[j + i] -= ab[diag + i] * bj
+
+		# Solve U x = y
+		for j in range(n-1, -1, -1):
+			base = j*ldab + kv - j
+			b[j] /= ab[base + j]
+			bj = b[j]
+			if bj == 0.0:
+				continue
+			for i in range(max(0, j-kv), j):
+				b[i] -= ab[base + i] * bj
+
+	def solve(A, B):
+		"""
+		Assumes A has been factored. Solves for all columns of B.
+		"""
+		if A.piv is None:
+			print("ERROR: BandedMatrix must be factored before solving")
+			return
+		if A.rows != B.rows:
+			print("ERROR: Incompatible sizes for matrix solving")
+			return
+
+		result = Matrix(B.rows, B.cols)
+		for j in range(0, B.cols):
+			b = array('d', B.matrix[:, j].tolist())
+			A._solve_column(b)
+			result.matrix[:, j] = b
+		return result
+
+
 """
 # Matrix Arithmetic Tests
 A = Matrix(2,2)
@@ -0,0 +1,69 @@
+"""
+checkpoint.py
+
+Saving and loading the state of an integration (see solver.solve and
+solver.resume).
+
+A checkpoint holds the states of the stepper, the SimTime, the step size
+controller and the tolerance, each a dict of arrays returned by their get_state
+methods, and is stored as an .npz file with one entry per array, named after
+its owner, e.g. stepper.y or time.dt. The file is first written under a temporary name, synced
+to disk and then renamed over the previous checkpoint, so an interruption at
+any point leaves either the old or the new checkpoint, never a partial one.
+"""
+
+import os
+import numpy as np
+
+PARTS = ('stepper', 'time', 'controller', 'tol')
+
+def get_attrs(obj, names):
+	"""
+	State dict of the named attributes of obj, copied into arrays
+	"""
+	return dict((name, np.array(getattr(obj, name))) for name in names)
+
+def set_attrs(obj, state, names):
+	"""
+	Restores the named attributes of obj from a state dict. Array attributes are
+	overwritten in place, so views of them (such as NumVecs) stay valid.
+	"""
+	for name in names:
+		current = getattr(obj, name, None)
+		if isinstance(current, np.ndarray):
+			np.copyto(current, state[name])
+		else:
+			setattr(obj, name, np.asarray(state[name]).item())
+
+def save_checkpoint(path, stepper, stime, controller, tol):
+	arrays = {'method': np.array(type(stepper).__name__)}
+	states = (stepper.get_state(), stime.get_state(), controller.get_state(), tol.get_state())
+	for part, state in zip(PARTS, states):
+		for name, value in state.items():
+			arrays[part + '.' + name] = value
+
+	temp = path + '.tmp'
+	with open(temp, 'wb') as out:
+		np.savez(out, **arrays)
+		out.flush()
+		os.fsync(out.fileno())
+	os.replace(temp, path)
+
+def load_checkpoint(path):
+	"""
+	Returns the contents of a checkpoint as a dict with the method name and the
+	state dicts of the stepper, time, controller and tol
+	"""
+	if not os.path.exists(path):
+		print("ERROR: No checkpoint at {}".format(path))
+		return
+	checkpoint = {}
+	for part in PARTS:
+		checkpoint[part] = {}
+	with np.load(path) as data:
+		for key in data.files:
+			part, dot, name = key.partition('.')
+			if part in checkpoint:
+				checkpoint[part][name] = data[key]
+		checkpoint['method'] = str(data['method'])
+	return checkpoint
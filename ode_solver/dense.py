@@ -0,0 +1,193 @@
+"""
+dense.py
+
+Continuous (dense) output and event location for solver.solve.
+
+Every accepted step is interpolated by the cubic Hermite polynomial through the
+solution and its derivative at both ends of the step. The derivatives come from
+the stepper (see Stepper.derivative), so no extra evaluations of f are needed.
+
+A DenseOutput passed to solve records every accepted step and can afterwards be
+evaluated at any time in [a, b], or at a whole grid of times at once:
+	sol = DenseOutput()
+	solve(f, a, b, y0, tol, dense=sol)
+	Y = sol(np.linspace(a, b, 1000))
+
+An Event wraps a function g(t, Y). After each accepted step, solve looks for a
+sign change of g across the step and locates the root on the interpolant, so
+events are found without restricting the step size. The times and states of
+all roots found are recorded on the Event, and a terminal event ends the
+integration at its first root:
+	surface = Event(lambda t, Y: Y[0]*Y[0] + Y[1]*Y[1] - R*R, terminal=True)
+	solve(f, a, b, y0, tol, events=[surface])
+"""
+
+import numpy as np
+from numvec import NumVec
+
+def hermite(t0, t1, y0, y1, f0, f1, t):
+	"""
+	Evaluates the cubic Hermite interpolant of (y0, f0) at t0 and (y1, f1) at t1
+	at the times t. t0, t1 and t may be arrays of the same length m, in which
+	case y0, y1, f0 and f1 are m x n and the result is m x n.
+	"""
+	h = t1 - t0
+	s = (t - t0) / h
+	s2 = s*s
+	s3 = s2*s
+	h00 = 2*s3 - 3*s2 + 1
+	h10 = (s3 - 2*s2 + s) * h
+	h01 = -2*s3 + 3*s2
+	h11 = (s3 - s2) * h
+	if np.ndim(s) > 0:
+		h00 = h00[:, None]
+		h10 = h10[:, None]
+		h01 = h01[:, None]
+		h11 = h11[:, None]
+	return h00*y0 + h10*f0 + h01*y1 + h11*f1
+
+class DenseOutput:
+	def __init__(self, capacity = 1024):
+		self.count = 0
+		self._capacity = capacity
+		self.t = None
+		self.y = None
+		self.f = None
+
+	def _grow(self, n):
+		capacity = self._capacity if self.t is None else 2*self.t.shape[0]
+		t = np.empty(capacity)
+		y = np.empty((capacity, n))
+		f = np.empty((capacity, n))
+		if self.t is not None:
+			t[0:self.count] = self.t[0:self.count]
+			y[0:self.count] = self.y[0:self.count]
+			f[0:self.count] = self.f[0:self.count]
+		self.t = t
+		self.y = y
+		self.f = f
+
+	def record(self, t, y, f):
+		"""
+		Appends the solution y and its derivative f at time t
+		"""
+		if self.t is None or self.count == self.t.shape[0]:
+			self._grow(len(y))
+		self.t[self.count] = t
+		self.y[self.count] = y
+		self.f[self.count] = f
+		self.count += 1
+
+	def __call__(self, t):
+		"""
+		Evaluates the solution at time t, or at every time in the array t. For
+		an array of m times the result is an m x n array.
+		"""
+		if self.count < 2:
+			print("ERROR: DenseOutput needs at least one accepted step")
+			return
+		ts = self.t[0:self.count]
+		scalar = np.ndim(t) == 0
+		t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+
+		i = np.searchsorted(ts, t, side='right') - 1
+		np.clip(i, 0, self.count-2, out=i)
+		Y = hermite(ts[i], ts[i+1], self.y[i], self.y[i+1], self.f[i], self.f[i+1], t)
+		if scalar:
+			return Y[0]
+		return Y
+
+class Event:
+	"""
+	Root of g(t, Y) to be located during integration. direction restricts the
+	crossings that count: 1 for g going from negative to positive, -1 for
+	positive to negative, 0 for both.
+	"""
+	def __init__(self, g, terminal = False, direction = 0):
+		self.g = g
+		self.terminal = terminal
+		self.direction = direction
+		self.t = []
+		self.y = []
+
+	def crosses(self, g_old, g_new):
+		if self.direction >= 0 and g_old < 0 <= g_new:
+			return True
+		if self.direction <= 0 and g_old > 0 >= g_new:
+			return True
+		return False
+
+class EventLocator:
+	"""
+	Checks a list of events across each accepted step. Keeps a copy of the
+	solution and derivative at the start of the current step.
+	"""
+	def __init__(self, events, t0, stepper):
+		self.events = events
+		n = stepper.size
+		self.t_old = t0
+		self.y_old = np.array(stepper.y)
+		self.f_old = np.array(stepper.derivative())
+		self._y = np.empty(n)
+		self._Y = NumVec(n, self._y)
+		self.g_old = [self._g(event, t0, self.y_old) for event in events]
+
+	def _g(self, event, t, y):
+		np.copyto(self._y, y)
+		return event.g(t, self._Y)
+
+	def _locate(self, event, g_lo, t_new, y_new, f_new):
+		"""
+		Finds the root of g on the interpolant of the current step with the
+		Illinois variant of regula falsi
+		"""
+		t_lo, t_hi = self.t_old, t_new
+		g_hi = self._g(event, t_new, y_new)
+		side = 0
+		t = t_hi
+		for i in range(0, 100):
+			if abs(t_hi - t_lo) <= 4*np.finfo(np.float64).eps*max(abs(t_lo), abs(t_hi)):
+				break
+			t = (t_lo*g_hi - t_hi*g_lo) / (g_hi - g_lo)
+			if not (t_lo < t < t_hi):
+				t = (t_lo + t_hi)/2
+			g = self._g(event, t, hermite(self.t_old, t_new, self.y_old, y_new, self.f_old, f_new, t))
+			if g == 0:
+				break
+			if (g < 0) == (g_lo < 0):
+				t_lo, g_lo = t, g
+				if side == -1:
+					g_hi /= 2
+				side = -1
+			else:
+				t_hi, g_hi = t, g
+				if side == 1:
+					g_lo /= 2
+				side = 1
+		return t
+
+	def check(self, t_new, stepper):
+		"""
+		Records the roots of all events in the step ending at t_new. Returns the
+		time and state of the earliest terminal root, or None.
+		"""
+		y_new = stepper.y
+		f_new = stepper.derivative()
+		terminal = None
+		for k in range(0, len(self.events)):
+			event = self.events[k]
+			g_old = self.g_old[k]
+			g_new = self._g(event, t_new, y_new)
+			if event.crosses(g_old, g_new):
+				t = self._locate(event, g_old, t_new, y_new, f_new)
+				y = hermite(self.t_old, t_new, self.y_old, y_new, self.f_old, f_new, t)
+				event.t.append(t)
+				event.y.append(y)
+				if event.terminal and (terminal is None or t < terminal[0]):
+					terminal = (t, y)
+			self.g_old[k] = g_new
+
+		self.t_old = t_new
+		np.copyto(self.y_old, y_new)
+		np.copyto(self.f_old, f_new)
+		return terminal
@@ -0,0 +1,215 @@
+"""
+ensemble.py
+
+Batched integration of many initial conditions with Adam's Method.
+
+solve_ensemble integrates m copies of the same system at once. Y0 is an m x n
+array whose rows are the initial states, and the right-hand side is evaluated
+on the whole batch:
+	f(t, Y)            or, with per-member parameters,    f(t, Y, params)
+where t is an array of the m members' current times, Y is m x n, params holds
+one row per member, and the result is an m x n array of derivatives.
+
+Each member keeps its own adaptive dt, following the same rules as
+solver.advance, and starts from its own estimate of the initial step. At every
+iteration all active members attempt a step; a mask selects which members
+accept and which reject and shrink their dt. Members that
+reach the end time are compacted out of the active set, so the array
+operations only ever run over members that still have work to do.
+
+As in solver.advance, a NaN error is rejected, and a member whose error is
+still infinite or NaN at the smallest time step fails: it is dropped with an
+error message, and its row of the result is NaN.
+"""
+
+import numpy as np
+from solver import AdamsStepper, PIController
+
+def solve_ensemble(f, a, b, Y0, tol, params = None):
+	Y0 = np.array(Y0, dtype=np.float64)
+	m = Y0.shape[0]
+	result = np.empty_like(Y0)
+
+	etime = EnsembleTime(a, b, m)
+	ids = np.arange(m)
+	Y_now = Y0
+	if params is not None:
+		params = np.asarray(params)
+	f_now = rhs(f, etime.time, Y_now, params)
+	f_old = f_now.copy()
+	controller = EnsemblePIController(AdamsStepper.order, m)
+
+	etime.dt = initial_step(f, etime.time, Y_now, f_now, AdamsStepper.order, tol, etime.dt_max, params)
+	np.clip(etime.dt, etime.dt_min, b - a, out=etime.dt)
+	# E.g. f is NaN at the initial state; such members fail at dt_min
+	etime.dt[~np.isfinite(etime.dt)] = etime.dt_min
+	etime.dt_old = etime.dt.copy()
+
+	while ids.shape[0] > 0:
+		time = etime.time
+		dt = etime.dt
+		dt_old = etime.dt_old
+		df = f_now - f_old
+		ratio = dt/dt_old
+
+		# Linear extrapolation of f at t_new
+		f_new = f_now + ratio[:, None] * df
+
+		# Prediction approximation of f at t_new
+		W = Y_now + dt[:, None]*f_now + ((dt*dt)/2)[:, None] * df / dt_old[:, None]
+
+		# Approximation of f at t_new
+		t_old = time-dt_old
+		t_new = time+dt
+		f_guess = rhs(f, t_new, W, params)
+
+		# Corrected approximation of f at t_new
+		c = (1.0/6.0)*ratio*(3*t_old - 2*time - t_new)
+		Y_new = W + (f_guess-f_new) * c[:, None]
+		err = Y_new - W
+		ei = np.sqrt(np.einsum('ij,ij->i', err, err))
+
+		# A NaN error is rejected too, and fails at dt_min
+		failed = ~np.isfinite(ei) & (dt <= etime.dt_min)
+		reject = ~(ei <= tol) & (dt > etime.dt_min)
+		accept = ~reject & ~failed
+		if failed.any():
+			print("ERROR: {} ensemble member(s) failed with the smallest time step {}".format(
+				int(failed.sum()), etime.dt_min))
+
+		# Rejected members shrink their step and try again
+		etime.stepsSinceRejection[reject] = 0
+		etime.stepsRejected[reject] += 1
+		dt[reject] = np.maximum(dt[reject] * controller.reject(reject, ei[reject]/tol), etime.dt_min)
+
+		# Accepted members move forward
+		if accept.any():
+			etime.stepsSinceRejection[accept] += 1
+			etime.stepsAccepted[accept] += 1
+			time[accept] += dt[accept]
+			dt_old[accept] = dt[accept]
+			Y_now[accept] = Y_new[accept]
+			f_old[accept] = f_now[accept]
+			f_now[accept] = rhs(f, time[accept], Y_now[accept],
+				None if params is None else params[accept])
+
+			# Grow or shrink dt
+			dt[accept] *= controller.accept(accept, ei[accept]/tol)
+
+			# End cases near endTime
+			np.minimum(dt, etime.dt_max, out=dt, where=accept)
+			remaining = etime.endTime - time
+			past = accept & (time+dt > etime.endTime)
+			near = accept & ~past & (time + 2*dt > etime.endTime)
+			dt[past] = remaining[past]
+			dt[near] = remaining[near]/2
+
+		# Compact finished members out of the active set
+		done = (time >= etime.endTime) | failed
+		if done.any():
+			result[ids[done]] = Y_now[done]
+			result[ids[failed]] = np.nan
+			keep = ~done
+			ids = ids[keep]
+			Y_now = Y_now[keep]
+			f_now = f_now[keep]
+			f_old = f_old[keep]
+			controller.compact(keep)
+			if params is not None:
+				params = params[keep]
+			etime.compact(keep)
+
+	return result
+
+def initial_step(f, t0, Y0, F0, order, tol, dt_max, params):
+	"""
+	Per-member counterpart of solver.initial_step
+	"""
+	d0 = np.sqrt(np.einsum('ij,ij->i', Y0, Y0)) / tol
+	d1 = np.sqrt(np.einsum('ij,ij->i', F0, F0)) / tol
+	small = (d0 < 1e-5) | (d1 < 1e-5)
+	h0 = np.where(small, 1e-6, 0.01 * d0/np.where(small, 1.0, d1))
+	np.minimum(h0, dt_max, out=h0)
+
+	F1 = rhs(f, t0 + h0, Y0 + h0[:, None]*F0, params)
+	D = F1 - F0
+	d2 = np.sqrt(np.einsum('ij,ij->i', D, D)) / tol / h0
+
+	dmax = np.maximum(d1, d2)
+	flat = dmax <= 1e-15
+	h1 = np.where(flat, np.maximum(1e-6, h0*1e-3),
+		(0.01 / np.where(flat, 1.0, dmax)) ** (1.0 / (order + 1)))
+	return np.minimum(np.minimum(100*h0, h1), dt_max)
+
+def rhs(f, t, Y, params):
+	if params is None:
+		return np.array(f(t, Y), dtype=np.float64)
+	return np.array(f(t, Y, params), dtype=np.float64)
+
+class EnsembleTime:
+	"""
+	Per-member counterpart of solver.SimTime. Each attribute that SimTime keeps
+	per solve is an array with one entry per active member; finished members
+	are dropped by compact, and their step counts are accumulated in totals.
+	"""
+	def __init__(self, beginTime, endTime, members):
+		self.time = np.full(members, float(beginTime))
+		self.dt = np.full(members, 1e-6)
+		self.dt_old = self.dt.copy()
+		self.dt_min = 1e-6
+		self.dt_max = 1.0
+		self.endTime = endTime
+
+		self.stepsSinceRejection = np.zeros(members, dtype=np.int64)
+		self.stepsRejected = np.zeros(members, dtype=np.int64)
+		self.stepsAccepted = np.zeros(members, dtype=np.int64)
+
+		self.totalRejected = 0
+		self.totalAccepted = 0
+
+	def compact(self, keep):
+		self.totalRejected += int(self.stepsRejected[~keep].sum())
+		self.totalAccepted += int(self.stepsAccepted[~keep].sum())
+		self.time = self.time[keep]
+		self.dt = self.dt[keep]
+		self.dt_old = self.dt_old[keep]
+		self.stepsSinceRejection = self.stepsSinceRejection[keep]
+		self.stepsRejected = self.stepsRejected[keep]
+		self.stepsAccepted = self.stepsAccepted[keep]
+
+class EnsemblePIController(PIController):
+	"""
+	PIController with one error history per member
+	"""
+	def __init__(self, order, members):
+		PIController.__init__(self, order)
+		self.ratio_old = np.ones(members)
+		self.rejected = np.zeros(members, dtype=bool)
+
+	def accept(self, mask, ratio):
+		"""
+		Returns the step size factors for the members selected by mask, whose
+		steps were accepted with error ratios ratio
+		"""
+		ratio = np.maximum(ratio, 1e-10)
+		fac = self.safety * ratio**(-self.alpha) * self.ratio_old[mask]**self.beta
+		fac = np.clip(fac, self.fac_min, self.fac_max)
+		fac = np.where(self.rejected[mask], np.minimum(fac, 1.0), fac)
+		self.rejected[mask] = False
+		self.ratio_old[mask] = ratio
+		return fac
+
+	def reject(self, mask, ratio):
+		"""
+		Returns the step size factors for the members selected by mask, whose
+		steps were rejected with error ratios ratio
+		"""
+		with np.errstate(divide='ignore'):
+			fac = self.safety * ratio**(-1.0/(self.order + 1))
+		fac = np.where(self.rejected[mask], np.minimum(fac, 0.5), fac)
+		self.rejected[mask] = True
+		return np.where(fac >= self.fac_min, fac, self.fac_min)
+
+	def compact(self, keep):
+		self.ratio_old = self.ratio_old[keep]
+		self.rejected = self.rejected[keep]
@@ -0,0 +1,230 @@
+"""
+jit.py
+
+Compiled integration loop for small systems, using Numba if it is installed.
+
+solve_jit integrates y' = f(t, y) with the Dormand-Prince method and the same
+step size control as solver.solve (PIController and the rules of advance), but
+the whole adaptive loop, stages, error norm and step size control included,
+is compiled with numba.njit, so there is no interpreter overhead per step. f
+has to be of the form f(t, y, out) and compilable by Numba; a plain Python
+function is compiled with numba.njit on the way in.
+
+With record=True the state after every accepted step (or every every-th one)
+is stored in arrays that are grown as needed, and returned as (T, Ys) along
+with the solution.
+
+If Numba is not installed, or f cannot be compiled, solve_jit falls back to
+solver.solve with rk.DormandPrince, which follows the same method and returns
+the same results (up to rounding). So does a tolerance.Tolerance other than a
+single absolute tolerance, which the compiled loop does not support.
+
+Usage:
+	@numba.njit
+	def f(t, y, out):
+		...
+	Y = solve_jit(f, a, b, y0, tol)
+	Y, T, Ys = solve_jit(f, a, b, y0, tol, record=True)
+"""
+
+import numpy as np
+from numvec import NumVec
+from solver import solve, initial_step, PIController, SimTime
+from rk import DormandPrince
+from tolerance import Tolerance
+
+try:
+	import numba
+except ImportError:
+	numba = None
+
+# Dormand-Prince tableau as dense arrays. The last row of A is B, so the last
+# stage is f at the new solution.
+C = np.array(DormandPrince.C)
+A = np.zeros((7, 7))
+for i in range(0, 6):
+	A[i+1, 0:i+1] = DormandPrince.A[i]
+E = np.array(DormandPrince.E)
+ORDER = DormandPrince.order
+
+# Indices into the state array that carries the loop's scalars between calls
+TIME, DT, RATIO_OLD, REJECTED, ACCEPTED, NREJECTED, NFEV, COUNT, FAILED = range(0, 9)
+
+def _dopri_loop(f, y, K, state, t_end, tol, dt_min, dt_max, safety, fac_min, fac_max, every, T, Ys):
+	"""
+	Runs the adaptive loop from the time in state until t_end, or until the
+	trajectory arrays T and Ys are full. y and K[0] hold the solution and f at
+	the current time on entry and on return. Returns True when t_end is
+	reached, or when a step fails at dt_min, which sets state[FAILED].
+	"""
+	n = y.shape[0]
+	stage = np.empty(n)
+	k = ORDER + 1
+	alpha = 0.7/k
+	beta = 0.4/k
+	record = T.shape[0] > 0
+
+	t = state[TIME]
+	dt = state[DT]
+	while t < t_end:
+		if record and state[COUNT] == T.shape[0]:
+			state[TIME] = t
+			state[DT] = dt
+			return False
+
+		# Stages; the last one is f at the new solution, left in stage
+		for i in range(1, 7):
+			for j in range(0, n):
+				s = 0.0
+				for l in range(0, i):
+					s += A[i, l] * K[l, j]
+				stage[j] = y[j] + dt*s
+			f(t + C[i]*dt, stage, K[i])
+		state[NFEV] += 6
+
+		err = 0.0
+		for j in range(0, n):
+			e = 0.0
+			for l in range(0, 7):
+				e += E[l] * K[l, j]
+			err += (dt*e)**2
+		ratio = np.sqrt(err) / tol
+
+		# As in advance, a NaN ratio is rejected, and fails at dt_min
+		if not np.isfinite(ratio) and dt <= dt_min:
+			state[FAILED] = 1
+			break
+		if not (ratio <= 1) and dt > dt_min:
+			# Reject step
+			fac = safety * ratio**(-1.0/k)
+			if state[REJECTED] != 0:
+				fac = min(fac, 0.5)
+			if not fac >= fac_min:
+				fac = fac_min
+			state[REJECTED] = 1
+			state[NREJECTED] += 1
+			dt = max(dt*fac, dt_min)
+			continue
+
+		# Accept step
+		t += dt
+		for j in range(0, n):
+			y[j] = stage[j]
+			K[0, j] = K[6, j]
+		state[ACCEPTED] += 1
+		if record and state[ACCEPTED] % every == 0:
+			c = int(state[COUNT])
+			T[c] = t
+			for j in range(0, n):
+				Ys[c, j] = y[j]
+			state[COUNT] += 1
+
+		# Grow or shrink dt
+		ratio = max(ratio, 1e-10)
+		fac = safety * ratio**(-alpha) * state[RATIO_OLD]**beta
+		fac = min(max(fac, fac_min), fac_max)
+		if state[REJECTED] != 0:
+			fac = min(fac, 1.0)
+			state[REJECTED] = 0
+		state[RATIO_OLD] = ratio
+		dt *= fac
+
+		# End cases near t_end
+		if dt > dt_max:
+			dt = dt_max
+		if t + dt > t_end:
+			dt = t_end - t
+		elif t + 2*dt > t_end:
+			dt = (t_end - t)/2
+
+	state[TIME] = t
+	state[DT] = dt
+	return True
+
+if numba is not None:
+	_dopri_loop = numba.njit(_dopri_loop)
+
+def solve_jit(f, a, b, y0, tol, dt0 = None, dt_max = None, record = False, every = 1, capacity = 1024):
+	"""
+	Solves y' = f(t, y) on [a, b] with y(a) = y0, for f of the form
+	f(t, y, out). Returns the solution at b as a NumVec, and with record=True
+	also the times and states of the recorded steps, starting with (a, y0).
+	If a step fails at the smallest time step, the solution is None (and the
+	recorded steps are those before the failure).
+	"""
+	if isinstance(tol, Tolerance):
+		if tol._plain:
+			tol = float(tol.atol)
+		elif numba is not None:
+			print("ERROR: The compiled loop only supports a single absolute tolerance, falling back to solver.solve")
+			if isinstance(f, numba.core.dispatcher.Dispatcher):
+				f = f.py_func
+			return _fallback(f, a, b, y0, tol, dt0, dt_max, record, every)
+	if numba is not None:
+		if not isinstance(f, numba.core.dispatcher.Dispatcher):
+			f = numba.njit(f)
+		try:
+			return _run(f, a, b, y0, tol, dt0, dt_max, record, every, capacity)
+		except numba.core.errors.NumbaError as err:
+			print("ERROR: Could not compile the loop for f, falling back to solver.solve")
+			print(err)
+			f = f.py_func
+	return _fallback(f, a, b, y0, tol, dt0, dt_max, record, every)
+
+def _run(f, a, b, y0, tol, dt0, dt_max, record, every, capacity):
+	n = len(y0)
+	y = np.array(y0, dtype=np.float64)
+	K = np.empty((7, n))
+	f(a, y, K[0])
+
+	nfev = 1
+
+	stime = SimTime(a, b)
+	stime.dt_max = b - a if dt_max is None else dt_max
+	if dt0 is None:
+		nfev += 1
+		def rhs(t, Y):
+			out = np.empty(n)
+			f(t, Y.vec, out)
+			return out
+		dt0 = initial_step(rhs, a, y, K[0], ORDER, tol, stime.dt_max)
+
+	controller = PIController(ORDER)
+	state = np.zeros(9)
+	state[TIME] = a
+	state[DT] = min(max(dt0, stime.dt_min), b - a)
+	state[RATIO_OLD] = 1.0
+	state[NFEV] = nfev
+
+	T = np.empty(capacity if record else 0)
+	Ys = np.empty((T.shape[0], n))
+	if record:
+		T[0] = a
+		Ys[0] = y
+		state[COUNT] = 1
+	while not _dopri_loop(f, y, K, state, b, tol, stime.dt_min, stime.dt_max,
+			controller.safety, controller.fac_min, controller.fac_max, every, T, Ys):
+		# The trajectory arrays are full
+		T = np.concatenate((T, np.empty(T.shape[0])))
+		Ys = np.concatenate((Ys, np.empty(Ys.shape)))
+	Y = NumVec(n, y)
+	if state[FAILED]:
+		print("ERROR: Step failed at time {} with the smallest time step {}".format(state[TIME], state[DT]))
+		Y = None
+	if record:
+		count = int(state[COUNT])
+		return Y, T[0:count], Ys[0:count]
+	return Y
+
+def _fallback(f, a, b, y0, tol, dt0, dt_max, record, every):
+	if not record:
+		return solve(f, a, b, y0, tol, stepper=DormandPrince, dt_max=dt_max, dt0=dt0)
+
+	T = [a]
+	Ys = [np.array(y0, dtype=np.float64)]
+	def callback(stime, stepper, dt, ratio, accepted):
+		if accepted and stime.stepsAccepted % every == 0:
+			T.append(stime.time)
+			Ys.append(stepper.y.copy())
+	Y = solve(f, a, b, y0, tol, stepper=DormandPrince, dt_max=dt_max, dt0=dt0, callback=callback)
+	return Y, np.array(T), np.array(Ys)
@@ -0,0 +1,268 @@
+"""
+linalg.py
+
+Linear algebra used by the implicit steppers.
+
+lu_factor computes an LU factorization with partial pivoting of a dense
+matrix, and lu_solve uses it to solve linear systems. The factorization is kept
+by the caller, so a matrix can be factored once and reused for many solves.
+Both work a row or column at a time with vectorized NumPy updates.
+
+banded_lu_factor and banded_lu_solve do the same for banded matrices, in band
+storage, with work proportional to n times the square of the bandwidth. For
+general sparse matrices, csr_pattern, color_columns and reverse_cuthill_mckee
+provide the compressed storage, the column coloring used to estimate sparse
+Jacobians with few evaluations of f, and a reordering that brings the nonzeros
+close to the diagonal so that the banded factorization can be used.
+"""
+
+import numpy as np
+
+def lu_factor(A):
+	"""
+	Factors the square matrix A as P A = L U, where L is unit lower triangular
+	and U is upper triangular. Returns (LU, piv): L and U packed into one array,
+	and the row interchanges, i.e. row k was swapped with row piv[k].
+	A is not modified.
+	"""
+	LU = np.array(A, dtype=np.float64)
+	n = LU.shape[0]
+	piv = np.arange(n)
+	for k in range(0, n):
+		# Partial pivoting: bring the largest entry of column k to the diagonal
+		p = k + int(np.argmax(np.abs(LU[k:, k])))
+		piv[k] = p
+		if p != k:
+			LU[[k, p]] = LU[[p, k]]
+		pivot = LU[k, k]
+		if pivot == 0.0:
+			continue
+
+		# Compute column k of L and update the trailing submatrix
+		LU[k+1:, k] /= pivot
+		LU[k+1:, k+1:] -= np.outer(LU[k+1:, k], LU[k, k+1:])
+	return LU, piv
+
+def lu_solve(factors, b):
+	"""
+	Solves A x = b given factors = lu_factor(A). b may be a vector or a matrix
+	with one right-hand side per column.
+	"""
+	LU, piv = factors
+	x = np.array(b, dtype=np.float64)
+	n = LU.shape[0]
+
+	# Apply the row interchanges
+	for k in range(0, n):
+		p = piv[k]
+		if p != k:
+			x[[k, p]] = x[[p, k]]
+
+	# Solve L z = P b
+	for k in range(1, n):
+		x[k] -= np.dot(LU[k, 0:k], x[0:k])
+
+	# Solve U x = z
+	for k in range(n-1, -1, -1):
+		x[k] -= np.dot(LU[k, k+1:], x[k+1:])
+		x[k] /= LU[k, k]
+	return x
+
+# Banded matrices
+#
+# A matrix with lower bandwidth l and upper bandwidth u is stored column by
+# column as an n x (l+u+1) array ab, with A[i, j] in ab[j, u + i - j] (the
+# LAPACK band storage, transposed so that each column of A is a row of ab).
+# The LU factorization with partial pivoting needs l more superdiagonals for
+# fill-in, so it is stored in the same way with upper bandwidth l+u.
+
+def band_view(ab, lower, upper):
+	"""
+	Returns the n x n matrix stored in ab as a strided view, so that A[i, j]
+	can be indexed directly. Only entries within the band may be accessed; the
+	others alias other entries of ab.
+	"""
+	n = ab.shape[0]
+	w = lower + upper + 1
+	if ab.shape[1] != w:
+		print("ERROR: Band storage must have {} columns".format(w))
+		return
+	flat = ab.reshape(-1)
+	item = flat.itemsize
+	# A[i, j] is at flat[j*w + upper + i - j] = flat[upper + i + j*(w-1)]
+	return np.lib.stride_tricks.as_strided(flat[upper:], shape=(n, n), strides=(item, (w-1)*item))
+
+def band_matvec(ab, lower, upper, x):
+	"""
+	Computes A x for the banded matrix A stored in ab
+	"""
+	n = ab.shape[0]
+	y = np.zeros(n)
+	for k in range(-upper, lower + 1):
+		# Entries A[j+k, j] of the kth diagonal
+		lo = max(0, -k)
+		hi = min(n, n - k)
+		y[lo+k:hi+k] += ab[lo:hi, upper + k] * x[lo:hi]
+	return y
+
+def banded_lu_factor(ab, lower, upper):
+	"""
+	Factors the banded matrix A stored in ab as P A = L U. Returns (LU, piv) in
+	the form used by banded_lu_solve; ab is not modified.
+	"""
+	n = ab.shape[0]
+	kv = lower + upper
+	LU = np.zeros((n, lower + kv + 1))
+	LU[:, lower:] = ab
+	A = band_view(LU, lower, kv)
+	piv = np.arange(n)
+
+	ju = 0
+	for j in range(0, n):
+		km = min(lower, n-1-j)
+		p = int(np.argmax(np.abs(A[j:j+km+1, j])))
+		piv[j] = j + p
+		# Last column that the fill-in of this step reaches
+		ju = max(ju, min(j + upper + p, n-1))
+		if p != 0:
+			A[[j, j+p], j:ju+1] = A[[j+p, j], j:ju+1]
+		pivot = A[j, j]
+		if pivot == 0.0 or km == 0:
+			continue
+		A[j+1:j+km+1, j] /= pivot
+		if ju > j:
+			A[j+1:j+km+1, j+1:ju+1] -= np.outer(A[j+1:j+km+1, j], A[j, j+1:ju+1])
+	return LU, piv
+
+def banded_lu_solve(factors, b, lower, upper):
+	"""
+	Solves A x = b given factors = banded_lu_factor(ab, lower, upper). b may be
+	a vector or a matrix with one right-hand side per column.
+	"""
+	LU, piv = factors
+	n = LU.shape[0]
+	kv = lower + upper
+	A = band_view(LU, lower, kv)
+	x = np.array(b, dtype=np.float64)
+
+	# Solve L z = P b, one column of L at a time
+	for j in range(0, n):
+		p = piv[j]
+		if p != j:
+			x[[j, p]] = x[[p, j]]
+		km = min(lower, n-1-j)
+		if km > 0:
+			x[j+1:j+km+1] -= np.multiply.outer(A[j+1:j+km+1, j], x[j])
+
+	# Solve U x = z; U has upper bandwidth kv
+	for j in range(n-1, -1, -1):
+		x[j] /= A[j, j]
+		top = max(0, j - kv)
+		if top < j:
+			x[top:j] -= np.multiply.outer(A[top:j, j], x[j])
+	return x
+
+# Sparse matrices
+#
+# A sparsity pattern is given by the row and column indices of its nonzero
+# entries. Sparse matrices are stored in compressed sparse row (CSR) form:
+# the column indices and values of row i are indices[indptr[i]:indptr[i+1]]
+# and data[indptr[i]:indptr[i+1]].
+
+def csr_pattern(rows, cols, n):
+	"""
+	Converts a sparsity pattern of an n x n matrix to CSR form. Returns
+	(indptr, indices, order), where order[k] is the position in the given
+	pattern of the kth stored entry. Duplicate entries are an error.
+	"""
+	rows = np.asarray(rows, dtype=np.int64)
+	cols = np.asarray(cols, dtype=np.int64)
+	order = np.lexsort((cols, rows))
+	r = rows[order]
+	c = cols[order]
+	if np.any((r[1:] == r[:-1]) & (c[1:] == c[:-1])):
+		print("ERROR: Sparsity pattern has duplicate entries")
+		return
+	indptr = np.zeros(n + 1, dtype=np.int64)
+	np.cumsum(np.bincount(r, minlength=n), out=indptr[1:])
+	return indptr, c, order
+
+def color_columns(indptr, indices, n):
+	"""
+	Greedy coloring of the columns of a sparse n x n matrix such that no two
+	columns of the same color have a nonzero in the same row. Columns are
+	colored in order of decreasing number of nonzeros, each with the smallest
+	color not used by a column it shares a row with. Returns an array with the
+	color of each column.
+	"""
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	col_order = np.argsort(indices, kind='stable')
+	col_ptr = np.zeros(n + 1, dtype=np.int64)
+	np.cumsum(np.bincount(indices, minlength=n), out=col_ptr[1:])
+	col_rows = rows[col_order]
+
+	colors = np.full(n, -1, dtype=np.int64)
+	mark = np.full(n + 1, -1, dtype=np.int64)
+	for j in np.argsort(-np.diff(col_ptr), kind='stable'):
+		# Colors of the columns sharing a row with column j
+		for i in col_rows[col_ptr[j]:col_ptr[j+1]]:
+			neighbours = colors[indices[indptr[i]:indptr[i+1]]]
+			mark[neighbours[neighbours >= 0]] = j
+		color = 0
+		while mark[color] == j:
+			color += 1
+		colors[j] = color
+	return colors
+
+def reverse_cuthill_mckee(indptr, indices, n):
+	"""
+	Reverse Cuthill-McKee ordering of a sparse n x n matrix, computed on its
+	symmetrized pattern. Returns perm such that the matrix A[perm][:, perm] has
+	a small bandwidth.
+	"""
+	rows = np.repeat(np.arange(n), np.diff(indptr))
+	# Symmetric adjacency lists without the diagonal
+	r = np.concatenate((rows, indices))
+	c = np.concatenate((indices, rows))
+	keep = r != c
+	r = r[keep]
+	c = c[keep]
+	order = np.lexsort((c, r))
+	r = r[order]
+	c = c[order]
+	unique = np.ones(len(r), dtype=bool)
+	unique[1:] = (r[1:] != r[:-1]) | (c[1:] != c[:-1])
+	r = r[unique]
+	c = c[unique]
+	ptr = np.zeros(n + 1, dtype=np.int64)
+	np.cumsum(np.bincount(r, minlength=n), out=ptr[1:])
+	degree = np.diff(ptr)
+
+	perm = []
+	visited = np.zeros(n, dtype=bool)
+	# Start each connected component from a node of smallest degree
+	for start in np.argsort(degree, kind='stable'):
+		if visited[start]:
+			continue
+		visited[start] = True
+		queue = [start]
+		head = 0
+		while head < len(queue):
+			node = queue[head]
+			head += 1
+			neighbours = c[ptr[node]:ptr[node+1]]
+			neighbours = neighbours[~visited[neighbours]]
+			neighbours = neighbours[np.argsort(degree[neighbours], kind='stable')]
+			visited[neighbours] = True
+			queue.extend(neighbours.tolist())
+		perm.extend(queue)
+	return np.array(perm[::-1], dtype=np.int64)
+
+def bandwidths(rows, cols):
+	"""
+	Lower and upper bandwidth of a matrix with nonzeros at (rows, cols)
+	"""
+	d = np.asarray(rows) - np.asarray(cols)
+	if len(d) == 0:
+		return 0, 0
+	return max(0, int(d.max())), max(0, int(-d.min()))
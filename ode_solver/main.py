@@ -3,49 +3,53 @@ main.py
 
 Runs the solver to simulate the falling marble.
 """
+import numpy as np
 from solver import solve
-from math import sqrt, log, pi
+from math import pi
 from numvec import NumVec
+from trajectory import TrajectoryRecorder
 
 # Radius of Earth
 R = 2e7/pi
 CIN = 9.8/R
 
-def fmarble(time, Y):
+def fmarble(time, y, out):
 	"""
 	Differential function for the motion of the marble. Since we are given the function for the
 	second derivative:
 		p''(t) = - Cin p
 	we will solve for both the marble's current x and y positions, as well as its current x and 
-	y velocities.
+	y velocities. The derivatives are written into out.
 
-	Y[0] = px	:	x position
-	Y[1] = py   :	y position
-	Y[2] = vx	:	x velocity
-	Y[3] = vy	:	y velocity
+	y[0] = px	:	x position
+	y[1] = py   :	y position
+	y[2] = vx	:	x velocity
+	y[3] = vy	:	y velocity
 	"""
-	val = NumVec(4)
-	
-	val[0] = Y[2]
-	val[1] = Y[3]
-	
-	val[2] = -Y[0] * CIN
-	val[3] = -Y[1] * CIN
-	return val
-
-def marble_tracer(filepath):
+	out[0:2] = y[2:4]
+	np.multiply(y[0:2], -CIN, out=out[2:4])
+
+def marble_energy(rows):
 	"""
-	Takes an output file and constructs a tracer function that we will pass to the solver. At each 
-	accepted forward step of the solver, the tracer function is responsible for writing to output 
-	the marble's location, the current time, the time step used, and the current energy.
+	E(t) = [ (sq(px')+sq(py')) + Cin * (sq(px)+sq(py)) ]/2, for a block of recorded rows
 	"""
-	trace_file = open(filepath, 'w')
-	def tracer(stime, Y):
-		# E(t) = [ (sq(px')+sq(py')) + Cin * (sq(px)+sq(py)) ]/2
-		energy = (Y[2]*Y[2]+Y[3]*Y[3] + CIN*(Y[0]*Y[0]+Y[1]*Y[1])) / 2
-		trace_file.write('{} {} {} {} {}\n'.format(Y[0], Y[1], stime.time, log(stime.dt, 10), energy))
-	return tracer
+	return (rows['vx']*rows['vx'] + rows['vy']*rows['vy'] + CIN*(rows['px']*rows['px'] + rows['py']*rows['py'])) / 2
+
+def marble_recorder(filepath):
+	"""
+	Constructs the recorder that we will pass to the solver as its tracer. At each accepted forward
+	step of the solver, it stores the marble's position and velocity, the current time and the time
+	step used in a binary trajectory file.
+	"""
+	return TrajectoryRecorder(filepath, 4, names=['px', 'py', 'vx', 'vy'])
 
 initial_px = R
 initial_vy = R*2*pi/(24*60*60)
-solve(fmarble, 0.0, 10000.0, NumVec(4, [initial_px, 0.0, 0.0, initial_vy]), 1e-2, marble_tracer('plots/marble_trace.txt'))
+recorder = marble_recorder('plots/marble_trace.npy')
+solve(fmarble, 0.0, 10000.0, NumVec(4, [initial_px, 0.0, 0.0, initial_vy]), 1e-2, recorder)
+recorder.close()
+
+# Columns for plot.gnu: the marble's location, the current time, log10 of the time step used,
+# and the current energy
+recorder.export_text('plots/marble_trace.txt',
+	['px', 'py', 't', lambda rows: np.log10(rows['dt']), marble_energy])
@@ -0,0 +1,68 @@
+"""
+models.py
+
+Helpers for building right-hand sides of the form f(t, y, out), which write y'
+into a caller-provided array instead of returning a new vector (see solver.py).
+Each helper returns such a function, with writes_out set so that solve does not
+need to inspect it.
+
+	rhs_out(f)                   marks f as writing into out
+	linear(A, b=None)            y' = A y + b
+	second_order(accel, dim)     y = (x, v) with x' = v, v' = accel(t, x, v)
+	combine(f1, f2, ...)         y' = f1 + f2 + ...
+
+For example, the marble of main.py is
+	second_order(lambda t, x, v, a: np.multiply(x, -CIN, out=a), 2)
+"""
+
+import numpy as np
+
+def rhs_out(f):
+	"""
+	Marks f as a right-hand side of the form f(t, y, out). Only needed when
+	the form cannot be told from the signature of f, e.g. for a builtin or
+	compiled function.
+	"""
+	f.writes_out = True
+	return f
+
+def linear(A, b = None):
+	"""
+	y' = A y + b for a constant matrix A and optional constant vector b
+	"""
+	A = np.array(A, dtype=np.float64)
+	if b is not None:
+		b = np.array(b, dtype=np.float64)
+	def f(t, y, out):
+		np.dot(A, y, out=out)
+		if b is not None:
+			out += b
+	return rhs_out(f)
+
+def second_order(accel, dim):
+	"""
+	Second order system x'' = a(t, x, x') written in first order form, with the
+	state y = (x, v) made of the positions x and velocities v, each of length
+	dim. accel(t, x, v, a) writes the acceleration into a; x, v and a are views
+	into y and out, so no copies are made.
+	"""
+	def f(t, y, out):
+		out[0:dim] = y[dim:2*dim]
+		accel(t, y[0:dim], y[dim:2*dim], out[dim:2*dim])
+	return rhs_out(f)
+
+def combine(*terms):
+	"""
+	Sum of several right-hand sides of the form f(t, y, out), e.g. separate
+	force terms. A work array for the terms after the first is allocated on
+	the first call and reused.
+	"""
+	work = []
+	def f(t, y, out):
+		if not work:
+			work.append(np.empty_like(out))
+		terms[0](t, y, out)
+		for term in terms[1:]:
+			term(t, y, work[0])
+			out += work[0]
+	return rhs_out(f)
@@ -2,16 +2,37 @@
 numvec.py
 
 Implementation of NumVec class, a class representation of vectors in R^n.
+
+The components are stored in vec, a contiguous float64 NumPy array, so all of
+the arithmetic is vectorized. The binary operators return new vectors; the
+in-place operators (+=, -=, *=, /=) and axpy update the vector's own storage
+without allocating a result.
 """
-from math import sqrt
+import numpy as np
+
+def _data(other):
+	"""
+	Returns the array behind a NumVec, or other itself for arrays and scalars
+	"""
+	if isinstance(other, NumVec):
+		return other.vec
+	return other
 
 class NumVec:
+	# Make NumPy defer to NumVec's reflected operators, so that
+	# ndarray + NumVec returns a NumVec rather than an object array
+	__array_ufunc__ = None
+
 	def __init__(self, size, vals = None):
 		self.size = size
 		if vals is None:
-			self.vec = [0.0] * size
+			self.vec = np.zeros(size)
 		else:
-			self.vec = vals
+			# Float64 arrays are wrapped without copying
+			self.vec = np.asarray(vals, dtype=np.float64)
+
+	def __len__(self):
+		return self.size
 
 	def __getitem__(self, idx):
 		return self.vec[idx]
@@ -19,59 +40,89 @@ class NumVec:
 	def __setitem__(self, idx, value):
 		self.vec[idx] = value
 
+	def __array__(self, dtype = None, copy = None):
+		# np.asarray (copy=None) gets a view of vec, np.array (copy=True) a copy
+		if dtype is None or dtype == self.vec.dtype:
+			if copy:
+				return self.vec.copy()
+			return self.vec
+		return self.vec.astype(dtype)
+
 	def __add__(self, other):
-		vecsum = NumVec(self.size)
-		for i in range(0, self.size):
-			vecsum[i] = self[i] + other[i]
-		return vecsum
+		return NumVec(self.size, self.vec + _data(other))
+
+	def __radd__(self, other):
+		return NumVec(self.size, _data(other) + self.vec)
 
 	def __sub__(self, other):
-		vecdif = NumVec(self.size)
-		for i in range(0, self.size):
-			vecdif[i] = self[i] - other[i]
-		return vecdif
+		return NumVec(self.size, self.vec - _data(other))
+
+	def __rsub__(self, other):
+		return NumVec(self.size, _data(other) - self.vec)
+
+	def __neg__(self):
+		return NumVec(self.size, -self.vec)
 
 	def __mul__(self, scalar):
 		"""
 		Defines right scalar multiplication
 		"""
-		vecprod = NumVec(self.size)
-		for i in range(0, self.size):
-			vecprod[i] = scalar * self[i]
-		return vecprod
+		return NumVec(self.size, self.vec * scalar)
 
 	def __rmul__(self, scalar):
 		"""
 		Defines left scalar multiplication
 		"""
-		vecprod = NumVec(self.size)
-		for i in range(0, self.size):
-			vecprod[i] = scalar * self[i]
-		return vecprod
+		return NumVec(self.size, scalar * self.vec)
 
-	def __div__(self, scalar):
+	def __truediv__(self, scalar):
 		"""
 		Defines scalar division
 		"""
-		vecquot = NumVec(self.size)
-		for i in range(0, self.size):
-			vecquot[i] = self[i] / scalar
-		return vecquot
+		return NumVec(self.size, self.vec / scalar)
+
+	__div__ = __truediv__
+
+	def __iadd__(self, other):
+		self.vec += _data(other)
+		return self
+
+	def __isub__(self, other):
+		self.vec -= _data(other)
+		return self
+
+	def __imul__(self, scalar):
+		self.vec *= scalar
+		return self
+
+	def __itruediv__(self, scalar):
+		self.vec /= scalar
+		return self
+
+	def axpy(self, a, x, work = None):
+		"""
+		Fused update self += a*x. If a scratch array work of the same size is
+		given, the product is formed there and nothing is allocated.
+		"""
+		if work is None:
+			self.vec += a * _data(x)
+		else:
+			np.multiply(_data(x), a, out=work)
+			self.vec += work
+		return self
+
+	def copy(self):
+		return NumVec(self.size, self.vec.copy())
 
 	def __eq__(self, other):
-		for i in range(self.size):
-			if self[i] != other[i]:
-				return False
-		return True
+		return bool(np.array_equal(self.vec, _data(other)))
 
 	def __str__(self):
-		return self.vec.__str__()
+		return self.vec.tolist().__str__()
 
 	def __repr__(self):
-		return self.vec.__repr__()
+		return self.vec.tolist().__repr__()
 
 	def norm(self):
-		sum_squares = 0
-		for xi in self.vec:
-			sum_squares += xi*xi
-		return sqrt(sum_squares)
+		# Euclidean norm through BLAS (dnrm2/ddot)
+		return float(np.linalg.norm(self.vec))
@@ -0,0 +1,120 @@
+"""
+rk.py
+
+Embedded Runge-Kutta steppers for solver.solve:
+	DormandPrince	RK5(4) of Dormand and Prince, with FSAL reuse
+	CashKarp	RK5(4) of Cash and Karp
+
+Both advance with the fifth order solution and use the difference to the
+embedded fourth order solution as the error estimate. A method is described by
+its Butcher tableau (C, A, B) and error weights E = B - B_hat; the stage
+derivatives are kept in the rows of one preallocated array so each stage is a
+single matrix-vector product.
+
+When the method is FSAL ("first same as last"), the last stage is evaluated at
+the new solution, so after an accepted step it is reused as the first stage of
+the next one and costs no extra evaluation of f.
+"""
+
+import numpy as np
+from numvec import NumVec
+from solver import Stepper, f_data
+
+class RungeKuttaStepper(Stepper):
+	# Subclasses define the tableau
+	C = None
+	A = None
+	B = None
+	E = None
+	fsal = False
+	state_attrs = ('y', 'K')
+
+	def __init__(self, f, t0, y0):
+		self.f = f
+		self.size = len(y0)
+		n = self.size
+		stages = len(self.C)
+
+		self._A = [np.array(row, dtype=np.float64) for row in self.A]
+		self._B = np.array(self.B, dtype=np.float64)
+		self._E = np.array(self.E, dtype=np.float64)
+
+		self.y = np.array(y0, dtype=np.float64)
+		self.y_new = np.empty(n)
+		self.err = np.empty(n)
+		self.K = np.empty((stages, n))
+		self.stage = np.empty(n)
+
+		self.Y_now = NumVec(n, self.y)
+		self.Y_new = NumVec(n, self.y_new)
+		self._stage = NumVec(n, self.stage)
+
+		np.copyto(self.K[0], f_data(f(t0, self.Y_now)))
+
+	def step(self, dt_old, dt, time):
+		K = self.K
+		stage = self.stage
+		y_new = self.y_new
+		err = self.err
+		last = len(self.C) - 1
+
+		for i in range(1, last + 1):
+			if self.fsal and i == last:
+				# The last stage is f at the new solution
+				np.dot(self._B[0:i], K[0:i], out=y_new)
+				y_new *= dt
+				y_new += self.y
+				np.copyto(K[i], f_data(self.f(time + dt, self.Y_new)))
+				break
+			np.dot(self._A[i-1], K[0:i], out=stage)
+			stage *= dt
+			stage += self.y
+			np.copyto(K[i], f_data(self.f(time + self.C[i]*dt, self._stage)))
+		else:
+			np.dot(self._B, K, out=y_new)
+			y_new *= dt
+			y_new += self.y
+
+		np.dot(self._E, K, out=err)
+		err *= dt
+		return err
+
+	def accept(self, time):
+		self.y, self.y_new = self.y_new, self.y
+		self.Y_now, self.Y_new = self.Y_new, self.Y_now
+		if self.fsal:
+			np.copyto(self.K[0], self.K[-1])
+		else:
+			np.copyto(self.K[0], f_data(self.f(time, self.Y_now)))
+
+	def derivative(self):
+		return self.K[0]
+
+class DormandPrince(RungeKuttaStepper):
+	order = 4
+	fsal = True
+	C = [0.0, 1.0/5, 3.0/10, 4.0/5, 8.0/9, 1.0, 1.0]
+	A = [
+		[1.0/5],
+		[3.0/40, 9.0/40],
+		[44.0/45, -56.0/15, 32.0/9],
+		[19372.0/6561, -25360.0/2187, 64448.0/6561, -212.0/729],
+		[9017.0/3168, -355.0/33, 46732.0/5247, 49.0/176, -5103.0/18656],
+		[35.0/384, 0.0, 500.0/1113, 125.0/192, -2187.0/6784, 11.0/84],
+	]
+	B = [35.0/384, 0.0, 500.0/1113, 125.0/192, -2187.0/6784, 11.0/84, 0.0]
+	E = [71.0/57600, 0.0, -71.0/16695, 71.0/1920, -17253.0/339200, 22.0/525, -1.0/40]
+
+class CashKarp(RungeKuttaStepper):
+	order = 4
+	C = [0.0, 1.0/5, 3.0/10, 3.0/5, 1.0, 7.0/8]
+	A = [
+		[1.0/5],
+		[3.0/40, 9.0/40],
+		[3.0/10, -9.0/10, 6.0/5],
+		[-11.0/54, 5.0/2, -70.0/27, 35.0/27],
+		[1631.0/55296, 175.0/512, 575.0/13824, 44275.0/110592, 253.0/4096],
+	]
+	B = [37.0/378, 0.0, 250.0/621, 125.0/594, 0.0, 512.0/1771]
+	E = [37.0/378 - 2825.0/27648, 0.0, 250.0/621 - 18575.0/48384,
+		125.0/594 - 13525.0/55296, -277.0/14336, 512.0/1771 - 1.0/4]
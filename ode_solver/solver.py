@@ -3,72 +3,413 @@ solver.py
 
 Implements Adam's Method for solving the ordinary differential equation:
 	y' = f(t, y)
+
+Integration methods implement the Stepper interface and are driven by
+advance(), which accepts or rejects each attempted step and chooses the next
+step size with a PIController. Embedded Runge-Kutta steppers live in rk.py,
+and the BDF stepper for stiff problems in stiff.py. Dense output and event
+location (dense.py) work on the accepted steps, so they never limit the step
+size.
+
+The right-hand side may be given in either of two forms:
+	f(t, Y)          returns y' for the NumVec Y, as a NumVec or array
+	f(t, y, out)     writes y' for the array y into the array out
+solve tells them apart by the number of parameters of f (see writes_out) and
+calls the second form with a preallocated out, so it allocates nothing per
+call. models.py has helpers for building functions of that form.
+
+Adam's Method is carried out by an AdamsStepper, which allocates its work
+arrays once per solve call. Every attempted step, accepted or rejected, writes
+its predictor, corrector and error estimate into those same arrays, so the step
+loop itself does not allocate. The Y passed to the tracer is a view of one of
+these arrays and is overwritten by later steps; copy it to keep it.
 """
 
-from math import sqrt, pi, pow
+import time
+import inspect
+import numpy as np
 from numvec import NumVec
+from dense import EventLocator
+from stats import SolverStats
+from tolerance import Tolerance, as_tolerance
+from checkpoint import save_checkpoint, load_checkpoint, get_attrs, set_attrs
+
+# Seconds between checkpoints
+CHECKPOINT_INTERVAL = 600.0
+
+def solve(f, a, b, y0, tol, tracer = (lambda stime, Y: None), stepper = None, dt_max = None,
+	dense = None, events = None, stats = False, callback = None, dt0 = None,
+	checkpoint = None, checkpoint_interval = CHECKPOINT_INTERVAL, **options):
+	"""
+	Solves y' = f(t, y) on [a, b] with y(a) = y0, to the tolerance tol, which is
+	either a number or a tolerance.Tolerance. stepper is the Stepper class
+	implementing the method (AdamsStepper by default, or e.g. rk.DormandPrince),
+	and dt_max overrides the stepper's largest allowed time step. The first
+	step is dt0 if given, and otherwise estimated by initial_step. Any other
+	keyword options are passed on to the stepper.
+
+	dense is a dense.DenseOutput that records every accepted step, and events a
+	list of dense.Event. If a terminal event occurs, the integration stops there
+	and the solution at the event is returned.
+
+	callback(stime, stepper, dt, ratio, accepted) is called after every
+	attempted step. With stats=True, solve returns (Y, stats) where stats is a
+	stats.SolverStats describing the run.
 
-def solve(f, a, b, y0, tol, tracer = (lambda args: None)):
-	f_old = f(a, y0)
-	f_now = f(a, y0)
-	Y_now = y0
+	If checkpoint is a file path, the complete state of the integration is
+	saved there every checkpoint_interval seconds, and can be continued with
+	resume.
+
+	If a step fails even at the smallest time step, i.e. its error estimate is
+	infinite or NaN, solve reports an error and returns None in place of Y
+	(so (None, stats) with stats=True).
+	"""
+	f = rhs_function(f, len(y0))
+	f, solver_stats, callback = instrument(f, stats, callback)
+	tol = as_tolerance(tol)
+
+	if stepper is None:
+		stepper = AdamsStepper
+	stepper = stepper(f, a, y0, **options)
+	stepper.tol = tol
 
 	stime = SimTime(a, b)
+	if dt_max is not None:
+		stime.dt_max = dt_max
+	elif stepper.dt_max is not None:
+		stime.dt_max = stepper.dt_max
+	else:
+		stime.dt_max = b - a
+	if dt0 is None:
+		dt0 = initial_step(f, a, stepper.y, stepper.derivative(), stepper.order, tol, stime.dt_max)
+	stime.dt = min(max(dt0, stime.dt_min), b - a)
+	stime.dt_old = stime.dt
+
+	controller = PIController(stepper.order)
+	return run(stepper, stime, controller, tol, tracer, dense, events, solver_stats, callback,
+		checkpoint, checkpoint_interval)
+
+def resume(path, f, tracer = (lambda stime, Y: None), stepper = None, dense = None, events = None,
+	stats = False, callback = None, checkpoint = None, checkpoint_interval = CHECKPOINT_INTERVAL, **options):
+	"""
+	Continues the integration saved in the checkpoint file path by solve, with
+	the same f, stepper class and stepper options. The steps taken are exactly
+	the ones the original solve call would have taken. New checkpoints are
+	written to path again, unless checkpoint names another file.
+
+	Dense output, events and statistics are not part of the checkpoint; the
+	ones passed here only cover the resumed part of the integration.
+	"""
+	state = load_checkpoint(path)
+	if state is None:
+		return
+	if stepper is None:
+		stepper = AdamsStepper
+	if stepper.__name__ != state['method']:
+		print("ERROR: Checkpoint was written by {}, not {}".format(state['method'], stepper.__name__))
+		return
+
+	y = state['stepper']['y']
+	f = rhs_function(f, len(y))
+	f, solver_stats, callback = instrument(f, stats, callback)
+
+	stime = SimTime(0.0, 0.0)
+	stime.set_state(state['time'])
+	tol = Tolerance.from_state(state['tol'])
+	stepper = stepper(f, stime.time, y, **options)
+	stepper.tol = tol
+	stepper.set_state(state['stepper'])
+	controller = PIController(stepper.order)
+	controller.set_state(state['controller'])
+
+	if checkpoint is None:
+		checkpoint = path
+	return run(stepper, stime, controller, tol, tracer, dense, events, solver_stats, callback,
+		checkpoint, checkpoint_interval)
+
+def instrument(f, stats, callback):
+	"""
+	Sets up the statistics for a solve call if they are requested. Returns f,
+	the SolverStats (or None) and the callback to pass to advance.
+	"""
+	if not stats:
+		return f, None, callback
+	solver_stats = SolverStats()
+	f = solver_stats.wrap(f)
+	if callback is None:
+		return f, solver_stats, solver_stats.step
+	user_callback = callback
+	def both(stime, stepper, dt, ratio, accepted):
+		solver_stats.step(stime, stepper, dt, ratio, accepted)
+		user_callback(stime, stepper, dt, ratio, accepted)
+	return f, solver_stats, both
+
+def run(stepper, stime, controller, tol, tracer, dense, events, solver_stats, callback,
+	checkpoint, checkpoint_interval):
+	"""
+	Takes steps until stime.endTime, or until a terminal event
+	"""
+	if dense is not None:
+		dense.record(stime.time, stepper.y, stepper.derivative())
+	locator = None
+	if events:
+		locator = EventLocator(events, stime.time, stepper)
+	if checkpoint is not None:
+		last_checkpoint = time.time()
+
+	Y = None
+	failed = False
 	while stime.time < stime.endTime:
-		Y_now = advance(f, f_old, f_now, Y_now, stime, tol, tracer)
-		f_old = f_now
-		f_now = f(stime.time, Y_now)
+		if advance(stepper, stime, tol, tracer, controller, callback) is None:
+			failed = True
+			break
+		if dense is not None:
+			dense.record(stime.time, stepper.y, stepper.derivative())
+		if locator is not None:
+			hit = locator.check(stime.time, stepper)
+			if hit is not None:
+				stime.time = hit[0]
+				Y = NumVec(stepper.size, hit[1])
+				break
+		if checkpoint is not None and time.time() - last_checkpoint >= checkpoint_interval:
+			save_checkpoint(checkpoint, stepper, stime, controller, tol)
+			last_checkpoint = time.time()
+
+	if Y is None and not failed:
+		Y = NumVec(stepper.size, stepper.y.copy())
+	if solver_stats is not None:
+		solver_stats.finish(stepper)
+		return Y, solver_stats
+	return Y
+
+class Stepper:
+	"""
+	Interface between advance() and an integration method.
+
+	A stepper holds the current solution in y (with a NumVec view Y_now) and any
+	history the method needs. step(dt_old, dt, time) attempts a step of size dt
+	from time, where dt_old is the size of the previous accepted step; it leaves
+	the candidate solution in y_new (with a NumVec view Y_new) and returns the
+	local error estimate as an array. accept(time) makes the candidate the
+	current solution at the new time. derivative() returns y' at the current
+	solution, from values the method already has, for dense output.
+
+	order is the order of the error estimate, i.e. the error of a step of size
+	dt behaves like dt^(order+1); the step size controller relies on it.
+	dt_max is the method's default largest time step, or None for no limit.
+	The order may change between steps for variable order methods. solve sets
+	tol before the first step, for methods that solve implicit equations.
+
+	get_state() returns everything the next steps depend on as a dict of
+	arrays, and set_state(state) restores it into a stepper constructed for the
+	same problem. By default this is the attributes named in state_attrs.
+	"""
+	order = None
+	dt_max = None
+	tol = None
+	state_attrs = ('y',)
+
+	def get_state(self):
+		return get_attrs(self, self.state_attrs)
+
+	def set_state(self, state):
+		set_attrs(self, state, self.state_attrs)
+
+	def step(self, dt_old, dt, time):
+		raise NotImplementedError
+
+	def accept(self, time):
+		raise NotImplementedError
 
-	return Y_now
+	def derivative(self):
+		raise NotImplementedError
 
-def step(f, f_old, f_now, dt_old, dt, time, Y_now):
-	# Linear extrapolation of f at t_new
-	f_new = f_now + (dt/dt_old) * (f_now-f_old)
+class AdamsStepper(Stepper):
+	# Local error of the predictor is O(dt^3). The extrapolation of f degrades
+	# over long steps, so the default step size cap is kept at 1.
+	order = 2
+	dt_max = 1.0
+	state_attrs = ('y', 'f_now', 'f_old')
 
-	# Prediction approximation of f at t_new
-	W = Y_now + dt*f_now + (dt*dt)/2 * (f_now-f_old)/dt_old
+	def __init__(self, f, t0, y0):
+		self.f = f
+		self.size = len(y0)
+		n = self.size
 
-	# Approximation of f at t_new
-	t_old = time-dt_old
-	t_new = time+dt
-	f_guess = f(t_new, W)
+		# Current solution and the last two values of f
+		self.y = np.array(y0, dtype=np.float64)
+		self.f_now = np.empty(n)
+		self.f_old = np.empty(n)
 
-	# Corrected approximation of f at t_new. The integrated quadratic has been
-	# factored and thus looks like how it does in the expression.
-	Y_new = W + (f_guess-f_new) * (1.0/6.0)*(dt/dt_old)*(3*t_old - 2*time - t_new)
-	return (Y_new, Y_new - W) 
+		# Work arrays for a step attempt
+		self.y_new = np.empty(n)
+		self.f_new = np.empty(n)
+		self.W = np.empty(n)
+		self.df = np.empty(n)
+		self.err = np.empty(n)
 
-def advance(f, f_old, f_now, Y_now, stime, tol, tracer):
-	dt_old = stime.dt
+		# NumVec views of the arrays that are handed to f and the tracer
+		self.Y_now = NumVec(n, self.y)
+		self.Y_new = NumVec(n, self.y_new)
+		self._W = NumVec(n, self.W)
+
+		np.copyto(self.f_now, f_data(f(t0, self.Y_now)))
+		np.copyto(self.f_old, self.f_now)
+
+	def step(self, dt_old, dt, time):
+		"""
+		Attempts a step of size dt from time. The candidate solution is left in
+		y_new (Y_new) and the error estimate Y_new - W is returned.
+		"""
+		f_now = self.f_now
+		df = self.df
+		W = self.W
+		f_new = self.f_new
+		y_new = self.y_new
+		err = self.err
+
+		np.subtract(f_now, self.f_old, out=df)
+
+		# Linear extrapolation of f at t_new
+		np.multiply(df, dt/dt_old, out=f_new)
+		f_new += f_now
+
+		# Prediction approximation of f at t_new. y_new is free until the
+		# corrector, so it holds the quadratic term.
+		np.multiply(f_now, dt, out=W)
+		W += self.y
+		np.multiply(df, (dt*dt)/2, out=y_new)
+		y_new /= dt_old
+		W += y_new
+
+		# Approximation of f at t_new
+		t_old = time-dt_old
+		t_new = time+dt
+		f_guess = f_data(self.f(t_new, self._W))
+
+		# Corrected approximation of f at t_new. The integrated quadratic has been
+		# factored and thus looks like how it does in the expression.
+		np.subtract(f_guess, f_new, out=err)
+		err *= (1.0/6.0)*(dt/dt_old)*(3*t_old - 2*time - t_new)
+		np.add(W, err, out=y_new)
+		np.subtract(y_new, W, out=err)
+		return err
+
+	def accept(self, time):
+		"""
+		Makes the last attempted step the current solution at the given time
+		"""
+		self.y, self.y_new = self.y_new, self.y
+		self.Y_now, self.Y_new = self.Y_new, self.Y_now
+		self.f_old, self.f_now = self.f_now, self.f_old
+		np.copyto(self.f_now, f_data(self.f(time, self.Y_now)))
+
+	def derivative(self):
+		return self.f_now
+
+def initial_step(f, t0, y0, f0, order, tol, dt_max):
+	"""
+	Estimates a first step size from the norms of y0, f0 = f(t0, y0) and the
+	change of f over a trial Euler step, as in Hairer, Norsett and Wanner,
+	Solving Ordinary Differential Equations I, section II.4, for a method whose
+	error estimate has the given order. Costs one evaluation of f. Norms are
+	weighted by the tolerance at y0.
+	"""
+	tol = as_tolerance(tol)
+	d0 = tol.weighted_norm(y0, y0)
+	d1 = tol.weighted_norm(f0, y0)
+	if d0 < 1e-5 or d1 < 1e-5 or not np.isfinite(d0/d1):
+		h0 = 1e-6
+	else:
+		h0 = 0.01 * d0/d1
+	h0 = min(max(h0, 1e-6), dt_max)
+
+	y1 = y0 + h0*f0
+	f1 = f_data(f(t0 + h0, NumVec(len(y1), y1)))
+	d2 = tol.weighted_norm(f1 - f0, y0) / h0
+
+	if max(d1, d2) <= 1e-15:
+		h1 = max(1e-6, h0*1e-3)
+	else:
+		h1 = (0.01 / max(d1, d2)) ** (1.0 / (order + 1))
+	return min(100*h0, h1, dt_max)
+
+def writes_out(f):
+	"""
+	True if f takes the form f(t, y, out): either f.writes_out is set, or f has
+	a third positional parameter without a default value
+	"""
+	flag = getattr(f, 'writes_out', None)
+	if flag is not None:
+		return flag
+	try:
+		params = inspect.signature(f).parameters.values()
+	except (TypeError, ValueError):
+		return False
+	positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+	return len(positional) >= 3 and positional[2].default is inspect.Parameter.empty
+
+def rhs_function(f, n):
+	"""
+	Returns f in the form f(t, Y) used by the steppers. If f writes into out,
+	the returned function calls it with one array of size n, reused on every
+	call, and returns that array.
+	"""
+	if not writes_out(f):
+		return f
+	out = np.empty(n)
+	def rhs(t, Y):
+		f(t, Y.vec, out)
+		return out
+	return rhs
+
+def f_data(val):
+	"""
+	Returns the array behind a value returned by f
+	"""
+	if isinstance(val, NumVec):
+		return val.vec
+	return val
+
+def advance(stepper, stime, tol, tracer, controller, callback = None):
 	while True:
-		test_step = step(f, f_old, f_now, dt_old, stime.dt, stime.time, Y_now)
-		Y_guess = test_step[0]
-		ei = test_step[1].norm()
+		err = stepper.step(stime.dt_old, stime.dt, stime.time)
+		ratio = tol.weighted_norm(err, stepper.y, stepper.y_new)
 
-		if (ei > tol) and (stime.dt > stime.dt_min):
+		# A NaN ratio, e.g. from an overflow in f, is rejected too
+		if not np.isfinite(ratio) and stime.dt <= stime.dt_min:
+			# Not even the smallest step gives a usable solution, e.g. the Newton
+			# iteration of an implicit stepper does not converge
+			print("ERROR: Step failed at time {} with the smallest time step {}".format(stime.time, stime.dt))
+			return
+		if not (ratio <= 1) and (stime.dt > stime.dt_min):
 			# Reject step
+			if callback is not None:
+				callback(stime, stepper, stime.dt, ratio, False)
 			stime.stepsSinceRejection = 0
 			stime.stepsRejected += 1
-			stime.dt /= 2
+			stime.dt *= controller.reject(ratio)
 			if stime.dt < stime.dt_min:
 				stime.dt = stime.dt_min
 		else:
 			# Accept step
 
 			# Call tracer function to write to output
-			tracer(stime, Y_guess)
+			tracer(stime, stepper.Y_new)
 
 			# Update metadata regarding step rejections
 			stime.stepsSinceRejection += 1
 			stime.stepsAccepted += 1
 			stime.time += stime.dt
+			stime.dt_old = stime.dt
+			stepper.accept(stime.time)
+			if callback is not None:
+				callback(stime, stepper, stime.dt, ratio, True)
 
 			# Grow or shrink dt
-			if stime.stepsSinceRejection > 20:
-				if ei < tol/4:
-					stime.dt *= stime.agrow
-				elif ei > tol*0.75:
-					stime.dt *= stime.ashrink
+			if stepper.order != controller.order:
+				controller.set_order(stepper.order)
+			stime.dt *= controller.accept(ratio)
 
 			# End cases near endTime
 			if stime.dt > stime.dt_max:
@@ -78,20 +419,91 @@ def advance(f, f_old, f_now, Y_now, stime, tol, tracer):
 			elif stime.time + 2*stime.dt > stime.endTime:
 				stime.dt = (stime.endTime - stime.time)/2
 
-			return Y_guess
+			return stepper.Y_now
+
+class PIController:
+	"""
+	Proportional-integral step size controller. After an accepted step with
+	error ratio r = err/tol (and r_prev for the previous accepted step), the
+	step size is multiplied by
+		safety * r^(-alpha) * r_prev^beta,   alpha = 0.7/k, beta = 0.4/k
+	where k = order+1, clamped to [fac_min, fac_max]. After a rejected step it
+	is multiplied by
+		safety * r^(-1/k)
+	(at least fac_min, and at most 1/2 when the previous attempt was rejected
+	too) and tried again. The step following a rejection is not allowed to
+	grow.
+	"""
+	def __init__(self, order, safety = 0.9, fac_min = 0.2, fac_max = 5.0):
+		self.set_order(order)
+		self.safety = safety
+		self.fac_min = fac_min
+		self.fac_max = fac_max
+		self.ratio_old = 1.0
+		self.rejected = False
+
+	state_attrs = ('order', 'safety', 'fac_min', 'fac_max', 'ratio_old', 'rejected')
+
+	def get_state(self):
+		return get_attrs(self, self.state_attrs)
+
+	def set_state(self, state):
+		set_attrs(self, state, self.state_attrs)
+		self.set_order(self.order)
+
+	def set_order(self, order):
+		k = order + 1
+		self.order = order
+		self.alpha = 0.7/k
+		self.beta = 0.4/k
+
+	def reject(self, ratio):
+		"""
+		Returns the factor to apply to the step size after a rejected step
+		"""
+		fac = self.safety * ratio**(-1.0/(self.order + 1))
+		if self.rejected:
+			# Repeated rejections mean the error does not behave like
+			# dt^k yet, e.g. at a discontinuity
+			fac = min(fac, 0.5)
+		self.rejected = True
+		if not fac >= self.fac_min:
+			fac = self.fac_min
+		return fac
+
+	def accept(self, ratio):
+		"""
+		Returns the factor to apply to the step size after an accepted step
+		"""
+		ratio = max(ratio, 1e-10)
+		fac = self.safety * ratio**(-self.alpha) * self.ratio_old**self.beta
+		fac = min(max(fac, self.fac_min), self.fac_max)
+		if self.rejected:
+			fac = min(fac, 1.0)
+			self.rejected = False
+		self.ratio_old = ratio
+		return fac
 
 class SimTime:
+	state_attrs = ('time', 'dt', 'dt_old', 'tol', 'dt_min', 'dt_max', 'endTime',
+		'stepsSinceRejection', 'stepsRejected', 'stepsAccepted')
+
 	def __init__(self, beginTime, endTime):
 		self.time = beginTime
 		self.dt = 1e-6
-		self.dt_old = 0.1
+		# Size of the last accepted step
+		self.dt_old = self.dt
 		self.tol = 1e-2
-		self.agrow = 1.25
-		self.ashrink = 0.8
 		self.dt_min = 1e-6
 		self.dt_max = 1.0
 		self.endTime = endTime
-		
+
 		self.stepsSinceRejection = 0
 		self.stepsRejected = 0
 		self.stepsAccepted = 0
+
+	def get_state(self):
+		return get_attrs(self, self.state_attrs)
+
+	def set_state(self, state):
+		set_attrs(self, state, self.state_attrs)
@@ -0,0 +1,98 @@
+"""
+stats.py
+
+Statistics about a solve call.
+
+solve(..., stats=True) returns (Y, stats) where stats is a SolverStats. It
+counts the evaluations of f (including those spent on rejected steps and on
+finite difference Jacobians), the accepted and rejected steps and the sizes of
+the accepted steps, and splits the wall time between f and the solver itself.
+The wall time covers the whole solve call, from before the stepper is set up
+(including initial_step and the first Jacobian of implicit steppers) to the
+end of the integration.
+None of this is set up unless stats are requested, so a plain solve call runs
+exactly as before.
+
+Per-step instrumentation is available through the callback argument of solve,
+which is called after every attempted step as
+	callback(stime, stepper, dt, ratio, accepted)
+where dt is the size of the attempted step and ratio its error divided by tol.
+"""
+
+import time
+import numpy as np
+
+class SolverStats:
+	def __init__(self):
+		self.nfev = 0
+		self.nfev_rejected = 0
+		self.steps_accepted = 0
+		self.steps_rejected = 0
+		self.rhs_time = 0.0
+		self.wall_time = 0.0
+		self.njev = None
+		self.nlu = None
+		self.dts = []
+		self._nfev_step = 0
+		self._start = time.perf_counter()
+
+	def wrap(self, f):
+		"""
+		Returns f instrumented to count its calls and the time spent in it
+		"""
+		clock = time.perf_counter
+		def counted(t, Y):
+			start = clock()
+			val = f(t, Y)
+			self.rhs_time += clock() - start
+			self.nfev += 1
+			return val
+		return counted
+
+	def step(self, stime, stepper, dt, ratio, accepted):
+		if accepted:
+			self.steps_accepted += 1
+			self.dts.append(dt)
+		else:
+			self.steps_rejected += 1
+			self.nfev_rejected += self.nfev - self._nfev_step
+		self._nfev_step = self.nfev
+
+	def finish(self, stepper):
+		self.wall_time = time.perf_counter() - self._start
+		self.njev = getattr(stepper, 'njev', None)
+		self.nlu = getattr(stepper, 'nlu', None)
+
+	@property
+	def overhead_time(self):
+		return self.wall_time - self.rhs_time
+
+	@property
+	def rejection_ratio(self):
+		steps = self.steps_accepted + self.steps_rejected
+		if steps == 0:
+			return 0.0
+		return self.steps_rejected / steps
+
+	def dt_histogram(self, bins = 10):
+		"""
+		Histogram of log10 of the accepted step sizes. Returns (counts, edges)
+		as np.histogram does, with the edges in log10(dt).
+		"""
+		if not self.dts:
+			return np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+		return np.histogram(np.log10(self.dts), bins=bins)
+
+	def __str__(self):
+		lines = [
+			'f evaluations:    {} ({} on rejected steps)'.format(self.nfev, self.nfev_rejected),
+			'steps:            {} accepted, {} rejected ({:.1%})'.format(
+				self.steps_accepted, self.steps_rejected, self.rejection_ratio),
+			'wall time:        {:.4g} s ({:.4g} s in f, {:.4g} s overhead)'.format(
+				self.wall_time, self.rhs_time, self.overhead_time),
+		]
+		if self.njev is not None:
+			lines.append('jacobians:        {} ({} LU factorizations)'.format(self.njev, self.nlu))
+		if self.dts:
+			lines.append('dt:               {:.3g} to {:.3g}'.format(min(self.dts), max(self.dts)))
+		return '\n'.join(lines)
@@ -0,0 +1,418 @@
+"""
+stiff.py
+
+Implicit stepper for stiff problems.
+
+BDF implements the backward differentiation formulas of orders 1 to 5 in the
+quasi-constant step size form of Shampine and Reichelt (The MATLAB ODE Suite).
+The solution history is kept as a table of backward differences D, which is
+rescaled whenever the step size changes. After every order+1 accepted steps at
+one order, the order is moved up or down if that lets the next step be longer.
+
+Each step solves the implicit BDF equation with a simplified Newton iteration
+on the matrix I - c J, where J is the Jacobian of f and c = dt/alpha_k, and
+its corrections are measured with the same tolerance as the error estimates
+(see tolerance.py). The Jacobian is computed from jac(t, Y) if one is given
+and by finite differences otherwise, and the LU factorization of I - c J is
+kept between steps. It is not recomputed just because c changed a little;
+only when the Newton iteration fails to converge is the matrix refactored for
+the current c, and if that is not enough, the Jacobian is re-evaluated. A step
+whose iteration still fails is rejected.
+
+For large systems the Jacobian can be given a structure: band=(lower, upper)
+stores it as a banded matrix, and sparsity=(rows, cols) as a sparse matrix
+with nonzeros only at the given positions. Either way, finite differences
+need only a few evaluations of f, independent of the size of the system, and
+I - c J is factored as a banded matrix.
+
+Usage:
+	solve(f, a, b, y0, tol, tracer, stepper=BDF)
+	solve(f, a, b, y0, tol, tracer, stepper=BDF, jac=jac)
+	solve(f, a, b, y0, tol, tracer, stepper=BDF, band=(1, 1))
+	solve(f, a, b, y0, tol, tracer, stepper=BDF, sparsity=(rows, cols))
+"""
+
+import numpy as np
+from numvec import NumVec
+from solver import Stepper, f_data
+from linalg import lu_factor, lu_solve, banded_lu_factor, banded_lu_solve, csr_pattern
+from linalg import color_columns, reverse_cuthill_mckee, bandwidths
+
+MAX_ORDER = 5
+NEWTON_MAXITER = 4
+
+# The Newton iteration stops once its estimated remaining error is below this
+# fraction of tol
+NEWTON_TOL = 0.03
+
+# A factorization of I - c J is reused for a new c as long as they differ by
+# less than this relative amount
+LU_REUSE = 0.3
+
+def compute_R(order, factor):
+	"""
+	Matrix that maps the difference table for step size h onto the one for
+	step size factor*h
+	"""
+	I = np.arange(1, order + 1)[:, None]
+	J = np.arange(1, order + 1)
+	M = np.zeros((order + 1, order + 1))
+	M[1:, 1:] = (I - 1 - factor * J) / I
+	M[0] = 1
+	return np.cumprod(M, axis=0)
+
+def change_D(D, order, factor):
+	R = compute_R(order, factor)
+	U = compute_R(order, 1)
+	RU = R.dot(U)
+	D[0:order+1] = np.dot(RU.T, D[0:order+1])
+
+	# The higher differences are only used to estimate the error at the
+	# neighbouring orders, so scaling them to leading order is enough. This
+	# keeps those estimates meaningful when dt changes on every step.
+	D[order+1] *= factor**(order+1)
+	D[order+2] *= factor**(order+2)
+
+class Jacobian:
+	"""
+	Jacobian of f, together with the factorization of I - c J used by the
+	Newton iteration. Subclasses store J in different forms and implement
+	evaluate(t, y), factor(c) and solve(b).
+	"""
+	def __init__(self, f, n, jac = None):
+		self.f = f
+		self.n = n
+		self.jac = jac
+		self.J = None
+		self.lu = None
+		self.c = None
+		self.nfev = 0
+		self._y = np.empty(n)
+		self._Y = NumVec(n, self._y)
+
+	def _analytic(self, t, y):
+		np.copyto(self._y, y)
+		return np.array(self.jac(t, self._Y), dtype=np.float64)
+
+	def _differences(self, t, y, groups, store):
+		"""
+		Forward differences of f at y. For each group of columns of J that have
+		no nonzero row in common, all columns are perturbed at once and
+		store(g, df, delta) is called with the change df of f for group g.
+		"""
+		np.copyto(self._y, y)
+		f0 = np.array(f_data(self.f(t, self._Y)), dtype=np.float64)
+		delta = np.sqrt(np.finfo(np.float64).eps) * np.maximum(1.0, np.abs(y))
+		for g, columns in enumerate(groups):
+			self._y[columns] = y[columns] + delta[columns]
+			store(g, f_data(self.f(t, self._Y)) - f0, delta)
+			self._y[columns] = y[columns]
+		self.nfev += len(groups) + 1
+
+	def get_state(self):
+		state = {'J': self.J, 'c': np.array(np.nan if self.c is None else self.c),
+			'nfev': np.array(self.nfev)}
+		if self.lu is not None:
+			state['LU'], state['piv'] = self.lu
+		return state
+
+	def set_state(self, state):
+		self.J = np.array(state['J'])
+		self.c = None if np.isnan(state['c']) else float(state['c'])
+		self.nfev = int(state['nfev'])
+		self.lu = None
+		if 'LU' in state:
+			self.lu = (np.array(state['LU']), np.array(state['piv']))
+
+class DenseJacobian(Jacobian):
+	"""
+	Jacobian stored as a dense n x n matrix. jac(t, Y) returns that matrix.
+	"""
+	def evaluate(self, t, y):
+		if self.jac is not None:
+			self.J = self._analytic(t, y)
+			return
+		J = np.empty((self.n, self.n))
+		def store(j, df, delta):
+			J[:, j] = df / delta[j]
+		self._differences(t, y, [[j] for j in range(0, self.n)], store)
+		self.J = J
+
+	def factor(self, c):
+		self.lu = lu_factor(np.eye(self.n) - c*self.J)
+		self.c = c
+
+	def solve(self, b):
+		return lu_solve(self.lu, b)
+
+class BandedJacobian(Jacobian):
+	"""
+	Jacobian with lower bandwidth lower and upper bandwidth upper, in the band
+	storage of linalg.py: J[i, j] is in J[j, upper + i - j]. jac(t, Y) returns
+	the band storage array. Columns j with the same j mod (lower + upper + 1)
+	have no row in common, so finite differences take that many evaluations
+	of f, whatever n is.
+	"""
+	def __init__(self, f, n, lower, upper, jac = None):
+		Jacobian.__init__(self, f, n, jac)
+		self.lower = lower
+		self.upper = upper
+
+	def evaluate(self, t, y):
+		if self.jac is not None:
+			self.J = self._analytic(t, y)
+			return
+		n = self.n
+		lower = self.lower
+		upper = self.upper
+		J = np.zeros((n, lower + upper + 1))
+		width = min(lower + upper + 1, n)
+		groups = [np.arange(g, n, width) for g in range(0, width)]
+		def store(g, df, delta):
+			columns = groups[g]
+			for k in range(-upper, lower + 1):
+				# Entries J[j+k, j] of the columns in the group
+				cols = columns[(columns + k >= 0) & (columns + k < n)]
+				J[cols, upper + k] = df[cols + k] / delta[cols]
+		self._differences(t, y, groups, store)
+		self.J = J
+
+	def factor(self, c):
+		M = -c * self.J
+		M[:, self.upper] += 1.0
+		self.lu = banded_lu_factor(M, self.lower, self.upper)
+		self.c = c
+
+	def solve(self, b):
+		return banded_lu_solve(self.lu, b, self.lower, self.upper)
+
+class SparseJacobian(Jacobian):
+	"""
+	Jacobian with nonzeros only at the positions (rows[k], cols[k]) of a given
+	sparsity pattern, stored in CSR form. jac(t, Y) returns the values at these
+	positions, in the order of the pattern.
+
+	Finite differences perturb all columns of one color (see
+	linalg.color_columns) at once, so they take as many evaluations of f as
+	there are colors. For the factorization, the rows and columns are reordered
+	by reverse Cuthill-McKee and I - c J is factored as a banded matrix.
+	"""
+	def __init__(self, f, n, rows, cols, jac = None):
+		Jacobian.__init__(self, f, n, jac)
+		self.indptr, self.indices, self.order = csr_pattern(rows, cols, n)
+		self.rows = np.repeat(np.arange(n), np.diff(self.indptr))
+
+		colors = color_columns(self.indptr, self.indices, n)
+		self.colors = colors
+		self.groups = [np.flatnonzero(colors == color) for color in range(0, colors.max() + 1)]
+		# Stored entries belonging to the columns of each color
+		self.entries = [np.flatnonzero(colors[self.indices] == color) for color in range(0, len(self.groups))]
+
+		# Band storage of the reordered matrix, including the diagonal
+		self.perm = reverse_cuthill_mckee(self.indptr, self.indices, n)
+		inverse = np.empty(n, dtype=np.int64)
+		inverse[self.perm] = np.arange(n)
+		pr = inverse[self.rows]
+		pc = inverse[self.indices]
+		self.lower, self.upper = bandwidths(pr, pc)
+		self.band_index = (pc, self.upper + pr - pc)
+
+	def evaluate(self, t, y):
+		if self.jac is not None:
+			values = self._analytic(t, y)
+			self.J = values[self.order]
+			return
+		J = np.zeros(len(self.indices))
+		def store(color, df, delta):
+			entries = self.entries[color]
+			J[entries] = df[self.rows[entries]] / delta[self.indices[entries]]
+		self._differences(t, y, self.groups, store)
+		self.J = J
+
+	def factor(self, c):
+		M = np.zeros((self.n, self.lower + self.upper + 1))
+		M[self.band_index] = -c * self.J
+		M[:, self.upper] += 1.0
+		self.lu = banded_lu_factor(M, self.lower, self.upper)
+		self.c = c
+
+	def solve(self, b):
+		x = banded_lu_solve(self.lu, b[self.perm], self.lower, self.upper)
+		result = np.empty_like(x)
+		result[self.perm] = x
+		return result
+
+class BDF(Stepper):
+	state_attrs = ('y', 'D', 'h', 'order', 'steps_at_order', 'jac_current', 'njev', 'nlu')
+
+	def __init__(self, f, t0, y0, jac = None, max_order = MAX_ORDER, band = None, sparsity = None):
+		self.f = f
+		self.size = len(y0)
+		n = self.size
+		self.max_order = max_order
+		self.order = 1
+
+		kappa = 0.0
+		self.gamma = np.hstack((0, np.cumsum(1 / np.arange(1, MAX_ORDER + 1))))
+		self.alpha = (1 - kappa) * self.gamma
+		self.error_const = kappa * self.gamma + 1 / np.arange(1, MAX_ORDER + 2)
+
+		self.y = np.array(y0, dtype=np.float64)
+		self.y_new = np.empty(n)
+		self.y_predict = np.empty(n)
+		self.psi = np.empty(n)
+		self.d = np.empty(n)
+		self.rhs = np.empty(n)
+		self.err = np.empty(n)
+		self.dy = np.empty(n)
+
+		self.Y_now = NumVec(n, self.y)
+		self.Y_new = NumVec(n, self.y_new)
+
+		# Backward differences of the solution for step size h. The table is
+		# started with h = 1 and rescaled on the first step.
+		self.h = 1.0
+		self.D = np.zeros((MAX_ORDER + 3, n))
+		self.D[0] = self.y
+		self.D[1] = f_data(f(t0, self.Y_now))
+		self.steps_at_order = 0
+
+		if band is not None:
+			self.jacobian = BandedJacobian(f, n, band[0], band[1], jac)
+		elif sparsity is not None:
+			self.jacobian = SparseJacobian(f, n, sparsity[0], sparsity[1], jac)
+		else:
+			self.jacobian = DenseJacobian(f, n, jac)
+		self.jacobian.evaluate(t0, self.y)
+		self.jac_current = True
+		self.njev = 1
+		self.nlu = 0
+
+	def get_state(self):
+		state = Stepper.get_state(self)
+		for name, value in self.jacobian.get_state().items():
+			state['jacobian.' + name] = value
+		return state
+
+	def set_state(self, state):
+		Stepper.set_state(self, state)
+		prefix = 'jacobian.'
+		self.jacobian.set_state(dict((name[len(prefix):], value)
+			for name, value in state.items() if name.startswith(prefix)))
+
+	def derivative(self):
+		# The BDF formula of the current order, h y' = sum_j (1/j) D[j]
+		order = self.order
+		np.dot(1.0 / np.arange(1, order + 1), self.D[1:order+1], out=self.dy)
+		self.dy /= self.h
+		return self.dy
+
+	def _factor(self, c):
+		self.jacobian.factor(c)
+		self.nlu += 1
+
+	def _newton(self, t_new, c):
+		"""
+		Solves the BDF equation for the correction d to the predicted solution.
+		Returns True if the iteration converged.
+		"""
+		d = self.d
+		y = self.y_new
+		rhs = self.rhs
+		d.fill(0.0)
+		np.copyto(y, self.y_predict)
+
+		dy_norm_old = None
+		for k in range(0, NEWTON_MAXITER):
+			fy = f_data(self.f(t_new, self.Y_new))
+			if not np.all(np.isfinite(fy)):
+				return False
+			np.multiply(fy, c, out=rhs)
+			rhs -= self.psi
+			rhs -= d
+			dy = self.jacobian.solve(rhs)
+			dy_norm = self.tol.weighted_norm(dy, self.y_predict)
+
+			rate = None
+			if dy_norm_old is not None:
+				rate = dy_norm / dy_norm_old
+				if rate >= 1 or rate**(NEWTON_MAXITER - k) / (1 - rate) * dy_norm > NEWTON_TOL:
+					return False
+
+			y += dy
+			d += dy
+			if dy_norm == 0 or (rate is not None and rate / (1 - rate) * dy_norm < NEWTON_TOL):
+				return True
+			dy_norm_old = dy_norm
+		return False
+
+	def step(self, dt_old, dt, time):
+		D = self.D
+		order = self.order
+		if dt != self.h:
+			change_D(D, order, dt/self.h)
+			self.h = dt
+
+		t_new = time + dt
+		np.sum(D[0:order+1], axis=0, out=self.y_predict)
+		np.dot(self.gamma[1:order+1], D[1:order+1], out=self.psi)
+		self.psi /= self.alpha[order]
+		c = dt / self.alpha[order]
+
+		jacobian = self.jacobian
+		if jacobian.lu is None or abs(c - jacobian.c) > LU_REUSE * c:
+			self._factor(c)
+		while not self._newton(t_new, c):
+			if jacobian.c != c:
+				# The factorization was for another step size
+				self._factor(c)
+			elif not self.jac_current:
+				jacobian.evaluate(t_new, self.y_predict)
+				self.jac_current = True
+				self.njev += 1
+				self._factor(c)
+			else:
+				# Reject the step
+				self.err.fill(np.inf)
+				return self.err
+
+		np.multiply(self.d, self.error_const[order], out=self.err)
+		return self.err
+
+	def accept(self, time):
+		D = self.D
+		order = self.order
+		d = self.d
+
+		np.subtract(d, D[order+1], out=D[order+2])
+		D[order+1] = d
+		for i in range(order, -1, -1):
+			D[i] += D[i+1]
+
+		self.y, self.y_new = self.y_new, self.y
+		self.Y_now, self.Y_new = self.Y_new, self.Y_now
+		self.jac_current = False
+
+		# Order selection, once enough steps have been taken at this order
+		self.steps_at_order += 1
+		if self.steps_at_order <= order:
+			return
+		tol = self.tol
+		y = self.y
+		error_norm = tol.weighted_norm(self.error_const[order] * d, y)
+		if order > 1:
+			error_m_norm = tol.weighted_norm(self.error_const[order-1] * D[order], y)
+		else:
+			error_m_norm = np.inf
+		if order < self.max_order:
+			error_p_norm = tol.weighted_norm(self.error_const[order+1] * D[order+2], y)
+		else:
+			error_p_norm = np.inf
+
+		norms = np.array([error_m_norm, error_norm, error_p_norm])
+		with np.errstate(divide='ignore'):
+			factors = norms ** (-1.0 / np.arange(order, order + 3))
+		delta_order = int(np.argmax(factors)) - 1
+		if delta_order != 0:
+			self.order += delta_order
+			self.steps_at_order = 0
@@ -0,0 +1,171 @@
+"""
+sweep.py
+
+Runs solve over a grid of parameters on a pool of worker processes.
+
+A sweep is described by a grid, a dict from parameter names to the values to
+try, and a model factory. Every combination of values is a point of the sweep,
+numbered in the order of itertools.product. For each point the factory is
+called with the point's parameters as keyword arguments and returns the
+problem to solve:
+	factory(**params) -> (f, a, b, y0, tol)
+The factory is sent to the workers, so it has to be picklable, i.e. a function
+defined at the top level of a module.
+
+Results are written by the workers straight into memory mapped .npy files in
+the output directory, so nothing but a count is sent back per task:
+	points.npy	parameter values of each point, one column per parameter
+	results.npy	solution at b for each point
+	info.npy	nfev, accepted steps, rejected steps, wall time and a failure
+			flag (1 if solve failed, in which case the results are NaN)
+			per point
+	done.npy	1 for each point whose results have been written
+A point is marked done only after its results are flushed. Running the same
+sweep again with the same output directory skips the points that are done, so
+an interrupted sweep picks up where it stopped.
+
+Usage:
+	def marble(cin, vy, tol):
+		...
+		return fmarble, 0.0, 10000.0, y0, tol
+
+	grid = {'cin': [1e-6, 2e-6], 'vy': np.linspace(0, 500, 50), 'tol': [1e-2, 1e-4]}
+	results = sweep(marble, grid, 'marble_sweep', stepper=DormandPrince)
+"""
+
+import os
+import sys
+import time
+import itertools
+import multiprocessing
+import numpy as np
+from solver import solve
+
+INFO_COLUMNS = ['nfev', 'accepted', 'rejected', 'wall_time', 'failed']
+
+def grid_points(grid):
+	"""
+	Returns the parameter names of a grid and an array with one row of
+	parameter values per point
+	"""
+	names = list(grid.keys())
+	values = [list(grid[name]) for name in names]
+	points = np.array(list(itertools.product(*values)), dtype=np.float64)
+	return names, points.reshape(-1, len(names))
+
+def open_sweep(out_dir, names, points, size):
+	"""
+	Creates the files of a sweep in out_dir, or checks that the ones already
+	there belong to the same sweep. Returns False if they do not.
+	"""
+	path = os.path.join(out_dir, 'points.npy')
+	if os.path.exists(path):
+		old = np.load(path)
+		results = np.load(os.path.join(out_dir, 'results.npy'), mmap_mode='r')
+		info = np.load(os.path.join(out_dir, 'info.npy'), mmap_mode='r')
+		if old.shape != points.shape or not np.array_equal(old, points) or results.shape[1] != size \
+				or info.shape[1] != len(INFO_COLUMNS):
+			print("ERROR: {} holds the results of a different sweep".format(out_dir))
+			return False
+		return True
+
+	if not os.path.isdir(out_dir):
+		os.makedirs(out_dir)
+	m = points.shape[0]
+	fmt = np.lib.format
+	fmt.open_memmap(os.path.join(out_dir, 'results.npy'), mode='w+', shape=(m, size)).flush()
+	fmt.open_memmap(os.path.join(out_dir, 'info.npy'), mode='w+', shape=(m, len(INFO_COLUMNS))).flush()
+	fmt.open_memmap(os.path.join(out_dir, 'done.npy'), mode='w+', dtype=np.uint8, shape=(m,)).flush()
+	with open(os.path.join(out_dir, 'names.txt'), 'w') as names_file:
+		names_file.write('\n'.join(names) + '\n')
+	# points.npy is written last; its presence marks a complete set of files
+	np.save(path, points)
+	return True
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+def _init_worker(factory, out_dir, names, options):
+	fmt = np.lib.format
+	_worker['factory'] = factory
+	_worker['names'] = names
+	_worker['options'] = options
+	_worker['points'] = np.load(os.path.join(out_dir, 'points.npy'))
+	_worker['results'] = fmt.open_memmap(os.path.join(out_dir, 'results.npy'), mode='r+')
+	_worker['info'] = fmt.open_memmap(os.path.join(out_dir, 'info.npy'), mode='r+')
+	_worker['done'] = fmt.open_memmap(os.path.join(out_dir, 'done.npy'), mode='r+')
+
+def _run_chunk(indices):
+	names = _worker['names']
+	points = _worker['points']
+	results = _worker['results']
+	info = _worker['info']
+	for i in indices:
+		params = dict(zip(names, points[i]))
+		f, a, b, y0, tol = _worker['factory'](**params)
+		Y, stats = solve(f, a, b, y0, tol, stats=True, **_worker['options'])
+		# A failed point is still marked done, so it is not retried on resume
+		if Y is None:
+			results[i] = np.nan
+		else:
+			results[i] = Y.vec
+		info[i] = (stats.nfev, stats.steps_accepted, stats.steps_rejected, stats.wall_time, Y is None)
+	results.flush()
+	info.flush()
+
+	done = _worker['done']
+	done[indices] = 1
+	done.flush()
+	return len(indices)
+
+def sweep(factory, grid, out_dir, processes = None, chunk = None, progress = True, **options):
+	"""
+	Solves the problem returned by factory at every point of grid, with up to
+	processes worker processes (one per core by default). Points are handed
+	out in chunks of chunk points. Any other keyword options are passed on to
+	solve. Returns the memory mapped results, one row per point.
+	"""
+	names, points = grid_points(grid)
+	m = points.shape[0]
+	if m == 0:
+		print("ERROR: The parameter grid is empty")
+		return
+
+	# The state size is needed to lay out the results file
+	f, a, b, y0, tol = factory(**dict(zip(names, points[0])))
+	if not open_sweep(out_dir, names, points, len(y0)):
+		return
+
+	done = np.load(os.path.join(out_dir, 'done.npy'))
+	pending = np.flatnonzero(done == 0)
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if chunk is None:
+		# Several chunks per process keep all workers busy until the end
+		chunk = max(1, len(pending) // (8*processes))
+	chunks = [pending[i:i+chunk] for i in range(0, len(pending), chunk)]
+
+	finished = m - len(pending)
+	start = time.time()
+	if chunks:
+		pool = multiprocessing.Pool(processes, _init_worker, (factory, out_dir, names, options))
+		try:
+			for count in pool.imap_unordered(_run_chunk, chunks):
+				finished += count
+				if progress:
+					elapsed = time.time() - start
+					rate = (finished - (m - len(pending))) / elapsed
+					remaining = (m - finished) / rate if rate > 0 else float('inf')
+					sys.stdout.write('\r{}/{} points, {:.1f} points/s, {:.0f} s left '.format(
+						finished, m, rate, remaining))
+					sys.stdout.flush()
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+		if progress:
+			sys.stdout.write('\n')
+
+	return np.load(os.path.join(out_dir, 'results.npy'), mmap_mode='r')
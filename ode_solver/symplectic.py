@@ -0,0 +1,164 @@
+"""
+symplectic.py
+
+Symplectic integrators for separable second order systems
+	x'' = a(x)
+such as the marble of main.py. Unlike the error controlled methods of solve,
+they do not let the energy drift: over long times its error stays bounded by
+a constant that depends on the step size, so long orbits can be run with large
+steps.
+
+	VelocityVerlet	second order, one evaluation of a per step
+	Yoshida4	fourth order composition of three Verlet steps (Yoshida,
+			Construction of higher order symplectic integrators, 1990)
+
+solve_symplectic takes the acceleration as a function accel(x, out) that writes
+a(x) into out, and the initial positions and velocities. The state is kept as
+one array y = (x, v), so the tracer and the result look like those of solve for
+the first order system, e.g. a trajectory.TrajectoryRecorder can be used as the
+tracer.
+
+By default the step size is fixed (dt, shortened so that it divides b - a).
+With adaptive=True the step size follows step_size(x, v), dt times
+sqrt(|x| / |a(x)|) relative to its initial value unless given, and is made
+time symmetric as in Hut, Makino and McMillan (Building a better leapfrog,
+1995): the step from z to z' uses h = (s(z) + s(z'))/2, found by repeating the
+step iterations times. This keeps the method reversible and its energy error
+bounded, at the cost of iterations+1 steps per accepted step.
+
+Usage:
+	def accel(x, out):
+		np.multiply(x, -CIN, out=out)
+	Y = solve_symplectic(accel, 0.0, 1e6, [R, 0.0], [0.0, vy], 100.0)
+"""
+
+import math
+import numpy as np
+from numvec import NumVec
+from solver import SimTime
+
+class SymplecticIntegrator:
+	# Subclasses define the weights of the Verlet substeps
+	weights = None
+	order = None
+
+	def __init__(self, accel, x0, v0):
+		self.accel = accel
+		self.dim = len(x0)
+		dim = self.dim
+		self.y = np.empty(2*dim)
+		self.y[0:dim] = x0
+		self.y[dim:] = v0
+		self.x = self.y[0:dim]
+		self.v = self.y[dim:]
+		self.a = np.empty(dim)
+		self.work = np.empty(dim)
+		self.Y = NumVec(2*dim, self.y)
+		accel(self.x, self.a)
+
+	def step(self, h):
+		"""
+		Advances (x, v) by h in place, with kick-drift-kick Verlet substeps.
+		The acceleration at the end of a substep is reused at the start of the
+		next one.
+		"""
+		x = self.x
+		v = self.v
+		a = self.a
+		work = self.work
+		for w in self.weights:
+			hw = h*w
+			np.multiply(a, 0.5*hw, out=work)
+			v += work
+			np.multiply(v, hw, out=work)
+			x += work
+			self.accel(x, a)
+			np.multiply(a, 0.5*hw, out=work)
+			v += work
+
+class VelocityVerlet(SymplecticIntegrator):
+	weights = (1.0,)
+	order = 2
+
+class Yoshida4(SymplecticIntegrator):
+	_w1 = 1.0 / (2.0 - 2.0**(1.0/3.0))
+	_w0 = 1.0 - 2.0*_w1
+	weights = (_w1, _w0, _w1)
+	order = 4
+
+def default_step_size(dt, x0, a0):
+	"""
+	Step size proportional to the time scale sqrt(|x| / |a|) of the motion,
+	equal to dt at the initial state (and dt where there is no acceleration)
+	"""
+	def scale(x, a):
+		na = np.linalg.norm(a)
+		if na == 0.0:
+			return np.inf
+		return math.sqrt(np.linalg.norm(x) / na)
+	s0 = scale(x0, a0)
+	if not (0.0 < s0 < np.inf):
+		return lambda x, v, a: dt
+	def step_size(x, v, a):
+		s = scale(x, a)
+		if s == np.inf:
+			# No acceleration, hence no time scale
+			return dt
+		return dt * s / s0
+	return step_size
+
+def solve_symplectic(accel, a, b, x0, v0, dt, method = Yoshida4, tracer = (lambda stime, Y: None),
+	adaptive = False, step_size = None, iterations = 2):
+	"""
+	Solves x'' = accel(x) on [a, b] with x(a) = x0, x'(a) = v0, with steps of
+	size dt (or steps following step_size(x, v, a) when adaptive). Returns the
+	final state (x, v) as a NumVec, or None if step_size gives a step that is
+	not positive and finite.
+	"""
+	if not (0.0 < dt < np.inf):
+		print("ERROR: Time step must be positive and finite")
+		return
+	integrator = method(accel, x0, v0)
+	stime = SimTime(a, b)
+
+	if not adaptive:
+		steps = max(1, int(math.ceil((b - a) / dt)))
+		stime.dt = (b - a) / steps
+		for i in range(0, steps):
+			integrator.step(stime.dt)
+			tracer(stime, integrator.Y)
+			stime.stepsAccepted += 1
+			stime.time = a + (i + 1) * stime.dt
+		return NumVec(len(integrator.y), integrator.y.copy())
+
+	if step_size is None:
+		step_size = default_step_size(dt, integrator.x, integrator.a)
+	y_start = np.empty(len(integrator.y))
+	a_start = np.empty(integrator.dim)
+	while stime.time < stime.endTime:
+		np.copyto(y_start, integrator.y)
+		np.copyto(a_start, integrator.a)
+		s_start = step_size(integrator.x, integrator.v, integrator.a)
+
+		# Time symmetric step size, by fixed point iteration
+		h = s_start
+		for k in range(0, iterations):
+			if not (0.0 < h < np.inf):
+				break
+			integrator.step(h)
+			h = (s_start + step_size(integrator.x, integrator.v, integrator.a)) / 2
+			np.copyto(integrator.y, y_start)
+			np.copyto(integrator.a, a_start)
+
+		if not (0.0 < h < np.inf):
+			print("ERROR: Step size {} at time {} is not positive and finite".format(h, stime.time))
+			return
+		if stime.time + h > stime.endTime:
+			h = stime.endTime - stime.time
+		integrator.step(h)
+		stime.dt = h
+		tracer(stime, integrator.Y)
+		stime.stepsAccepted += 1
+		stime.time += h
+		stime.dt_old = h
+	return NumVec(len(integrator.y), integrator.y.copy())
@@ -0,0 +1,176 @@
+"""
+test_solver.py
+
+Tests for solve and its steppers.
+
+To run the tests:
+$ python -m pytest test_solver.py
+"""
+import os
+import numpy as np
+import pytest
+import jit
+from numvec import NumVec
+from solver import solve, resume, PIController, SimTime, AdamsStepper
+from rk import DormandPrince, CashKarp
+from ensemble import solve_ensemble
+from sweep import sweep, INFO_COLUMNS
+from stiff import BDF
+from tolerance import Tolerance, RMS
+
+def test_bdf_fails_when_newton_cannot_converge(capsys):
+	# Far too stiff and oscillatory for the Newton iteration, even at dt_min
+	def f(t, y, out):
+		np.sin(1e10*y, out=out)
+		out *= 1e10
+	accepted = []
+	def callback(stime, stepper, dt, ratio, ok):
+		if ok:
+			accepted.append(stime.time)
+	assert solve(f, 0.0, 1.0, [1.0], 1e-6, stepper=BDF, callback=callback) is None
+	assert accepted == []
+	assert 'ERROR' in capsys.readouterr().out
+
+def oscillator(t, y, out):
+	out[0] = y[1]
+	out[1] = -y[0]
+
+def test_jit_loop_matches_dormand_prince():
+	a, b, y0, tol, dt0 = 0.0, 10.0, [1.0, 0.0], 1e-8, 1e-3
+	reference, stats = solve(oscillator, a, b, y0, tol, stepper=DormandPrince, dt0=dt0, stats=True)
+
+	# The loop as plain Python, whether or not Numba compiled it
+	loop = getattr(jit._dopri_loop, 'py_func', jit._dopri_loop)
+	y = np.array(y0)
+	K = np.empty((7, 2))
+	oscillator(a, y, K[0])
+	state = np.zeros(9)
+	state[jit.TIME] = a
+	state[jit.DT] = dt0
+	state[jit.RATIO_OLD] = 1.0
+	controller = PIController(jit.ORDER)
+	stime = SimTime(a, b)
+	empty = np.empty(0)
+	assert loop(oscillator, y, K, state, b, tol, stime.dt_min, b - a, controller.safety,
+		controller.fac_min, controller.fac_max, 1, empty, np.empty((0, 2)))
+
+	assert state[jit.TIME] == b
+	assert state[jit.ACCEPTED] == stats.steps_accepted
+	assert state[jit.NREJECTED] == stats.steps_rejected
+	assert np.allclose(y, reference.vec, rtol=0, atol=1e-12)
+
+def test_zero_atol_keeps_nan_errors():
+	tol = Tolerance([0.0, 1e-6], 1e-6)
+	assert np.isnan(tol.weighted_norm(np.array([np.nan, np.nan]), np.zeros(2), np.zeros(2)))
+	# A component that is zero with no error still counts as within tolerance
+	assert tol.weighted_norm(np.zeros(2), np.zeros(2), np.zeros(2)) == 0.0
+
+def test_nan_from_f_is_rejected_with_zero_atol(capsys):
+	def f(t, y, out):
+		out.fill(np.nan)
+	accepted = []
+	def callback(stime, stepper, dt, ratio, ok):
+		if ok:
+			accepted.append(stime.time)
+	assert solve(f, 0.0, 1.0, [1.0], Tolerance(0.0, 1e-6), stepper=DormandPrince, dt0=1e-3,
+		callback=callback) is None
+	assert accepted == []
+	assert 'ERROR' in capsys.readouterr().out
+
+@pytest.mark.parametrize('stepper', [AdamsStepper, DormandPrince, BDF])
+def test_solve_leaves_y0_unchanged(stepper):
+	y0 = NumVec(2, [1.0, 0.0])
+	first = solve(oscillator, 0.0, 3.0, y0, 1e-6, stepper=stepper)
+	assert list(y0) == [1.0, 0.0]
+	second = solve(oscillator, 0.0, 3.0, y0, 1e-6, stepper=stepper)
+	assert np.array_equal(first.vec, second.vec)
+
+def test_ensemble_drops_members_with_nan(capsys):
+	def f(t, Y, params):
+		out = np.empty_like(Y)
+		out[:, 0] = Y[:, 1]
+		out[:, 1] = -Y[:, 0]
+		# The second member's f breaks down after t = 1
+		out[(params > 0) & (t > 1.0)] = np.nan
+		return out
+	Y0 = [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+	result = solve_ensemble(f, 0.0, 3.0, Y0, 1e-6, params=np.array([0, 1, 0]))
+	assert np.all(np.isnan(result[1]))
+	assert np.all(np.isfinite(result[[0, 2]]))
+	assert np.allclose(result[0], [np.cos(3.0), -np.sin(3.0)], atol=1e-2)
+	assert 'ERROR' in capsys.readouterr().out
+
+def test_failed_solve_keeps_stats(capsys):
+	def f(t, y, out):
+		out.fill(np.nan)
+	Y, stats = solve(f, 0.0, 1.0, [1.0], 1e-6, stepper=DormandPrince, dt0=1e-3, stats=True)
+	assert Y is None
+	assert stats.steps_accepted == 0
+	assert stats.steps_rejected > 0
+	assert 'ERROR' in capsys.readouterr().out
+
+def test_jit_failure_matches_fallback(monkeypatch, capsys):
+	def f(t, y, out):
+		out.fill(np.nan)
+	Y, T, Ys = jit._fallback(f, 0.0, 1.0, [1.0], 1e-6, 1e-3, None, True, 1)
+	assert Y is None and list(T) == [0.0]
+	assert jit._fallback(f, 0.0, 1.0, [1.0], 1e-6, 1e-3, None, False, 1) is None
+
+	# The compiled path, with its loop run as plain Python
+	monkeypatch.setattr(jit, '_dopri_loop', getattr(jit._dopri_loop, 'py_func', jit._dopri_loop))
+	Y, T, Ys = jit._run(f, 0.0, 1.0, [1.0], 1e-6, 1e-3, None, True, 1, 16)
+	assert Y is None and list(T) == [0.0]
+	assert jit._run(f, 0.0, 1.0, [1.0], 1e-6, 1e-3, None, False, 1, 16) is None
+
+def decay(rate):
+	# Sweep model; a NaN rate makes solve fail
+	def f(t, y, out):
+		np.multiply(y, -rate, out=out)
+	return f, 0.0, 1.0, [1.0], 1e-6
+
+def test_sweep_records_failed_points(tmp_path, capsys):
+	out_dir = str(tmp_path / 'sweep')
+	grid = {'rate': [1.0, np.nan, 2.0]}
+	results = sweep(decay, grid, out_dir, processes=2, progress=False, stepper=DormandPrince)
+	assert np.allclose(results[[0, 2], 0], np.exp([-1.0, -2.0]), atol=1e-5)
+	assert np.isnan(results[1, 0])
+	info = np.load(os.path.join(out_dir, 'info.npy'))
+	assert list(info[:, INFO_COLUMNS.index('failed')]) == [0, 1, 0]
+	assert np.all(np.load(os.path.join(out_dir, 'done.npy')) == 1)
+
+def test_solve_jit_matches_dormand_prince():
+	numba = pytest.importorskip('numba')
+	f = numba.njit(oscillator)
+	reference = solve(oscillator, 0.0, 10.0, [1.0, 0.0], 1e-8, stepper=DormandPrince, dt0=1e-3)
+	Y = jit.solve_jit(f, 0.0, 10.0, [1.0, 0.0], 1e-8, dt0=1e-3)
+	assert np.allclose(Y.vec, reference.vec, rtol=0, atol=1e-12)
+	Y, T, Ys = jit.solve_jit(f, 0.0, 10.0, [1.0, 0.0], Tolerance(1e-8), dt0=1e-3, record=True)
+	assert np.allclose(Y.vec, reference.vec, rtol=0, atol=1e-12)
+	assert T[-1] == 10.0 and np.array_equal(Ys[-1], Y.vec)
+
+def test_solve_jit_with_tolerance(capsys):
+	tol = Tolerance([1e-8, 1e-6], 1e-6, RMS)
+	reference = solve(oscillator, 0.0, 10.0, [1.0, 0.0], tol, stepper=DormandPrince, dt0=1e-3)
+	Y = jit.solve_jit(oscillator, 0.0, 10.0, [1.0, 0.0], tol, dt0=1e-3)
+	assert np.array_equal(Y.vec, reference.vec)
+
+class Interrupt(Exception):
+	pass
+
+@pytest.mark.parametrize('stepper', [AdamsStepper, DormandPrince, CashKarp, BDF])
+def test_resume_is_bit_for_bit(tmp_path, stepper):
+	path = str(tmp_path / 'run.npz')
+	y0 = [1.0, 0.0]
+	reference = solve(oscillator, 0.0, 5.0, y0, 1e-6, stepper=stepper)
+
+	calls = [0]
+	def f(t, y, out):
+		calls[0] += 1
+		if calls[0] == 150:
+			raise Interrupt()
+		oscillator(t, y, out)
+	with pytest.raises(Interrupt):
+		solve(f, 0.0, 5.0, y0, 1e-6, stepper=stepper, checkpoint=path, checkpoint_interval=0.0)
+
+	Y = resume(path, oscillator, stepper=stepper)
+	assert np.array_equal(Y.vec, reference.vec)
@@ -0,0 +1,96 @@
+"""
+tolerance.py
+
+Error tolerances for solve.
+
+A Tolerance combines absolute and relative tolerances, each either one number
+or one value per component, with the norm used to measure errors. An error
+vector e for the solution y is measured as
+	|| e / (atol + rtol |y|) ||
+with the division taken component by component, so each component is held to
+its own scale, and a step is accepted when this is at most 1. The norm is one
+of
+	L2	Euclidean norm
+	RMS	root mean square, i.e. the Euclidean norm divided by sqrt(n)
+	MAX	largest absolute component
+
+A plain number tol passed to solve means Tolerance(tol), i.e. ||e|| <= tol in
+the Euclidean norm, which is how solve has always measured errors.
+
+The same Tolerance is used by advance to accept or reject steps and by the
+implicit steppers to decide when their Newton iterations have converged.
+"""
+
+import numpy as np
+
+L2 = 'l2'
+RMS = 'rms'
+MAX = 'max'
+
+def as_tolerance(tol):
+	if isinstance(tol, Tolerance):
+		return tol
+	return Tolerance(tol)
+
+class Tolerance:
+	def __init__(self, atol, rtol = 0.0, norm = L2):
+		if norm not in (L2, RMS, MAX):
+			print("ERROR: Unknown norm {}".format(norm))
+			return
+		self.atol = np.array(atol, dtype=np.float64)
+		self.rtol = np.array(rtol, dtype=np.float64)
+		self.norm = norm
+		# A scalar absolute tolerance alone needs no weights
+		self._plain = self.atol.ndim == 0 and not self.rtol.any() and norm == L2
+		# Components with atol = 0 have zero weight while they are zero
+		self._zero_atol = not np.all(self.atol > 0)
+		self._scale = None
+		self._work = None
+
+	def scale(self, y, y_new = None):
+		"""
+		Returns atol + rtol |y|, with |y| replaced by max(|y|, |y_new|) if y_new
+		is given. The result is a work array that is overwritten by the next call.
+		"""
+		if self._scale is None or self._scale.shape[0] != len(y):
+			self._scale = np.empty(len(y))
+			self._work = np.empty(len(y))
+		scale = self._scale
+		np.abs(y, out=scale)
+		if y_new is not None:
+			np.abs(y_new, out=self._work)
+			np.maximum(scale, self._work, out=scale)
+		scale *= self.rtol
+		scale += self.atol
+		return scale
+
+	def weighted_norm(self, e, y, y_new = None):
+		"""
+		Norm of e relative to the tolerances at the solution y (and y_new).
+		At most 1 means e is within tolerance.
+		"""
+		if self._plain:
+			return np.linalg.norm(e) / float(self.atol)
+		scale = self.scale(y, y_new)
+		work = self._work
+		if self._zero_atol:
+			with np.errstate(divide='ignore', invalid='ignore'):
+				np.divide(e, scale, out=work)
+			# 0/0 for a component that is zero and has no error. A NaN in e
+			# or y_new stays NaN, so the step is rejected.
+			work[(np.asarray(e) == 0.0) & (scale == 0.0)] = 0.0
+		else:
+			np.divide(e, scale, out=work)
+		if self.norm == MAX:
+			return float(np.max(np.abs(work)))
+		norm = np.linalg.norm(work)
+		if self.norm == RMS:
+			norm /= np.sqrt(len(work))
+		return norm
+
+	def get_state(self):
+		return {'atol': self.atol, 'rtol': self.rtol, 'norm': np.array(self.norm)}
+
+	@classmethod
+	def from_state(cls, state):
+		return cls(state['atol'], state['rtol'], str(state['norm']))
@@ -0,0 +1,141 @@
+"""
+trajectory.py
+
+Buffered binary recording of a solution trajectory.
+
+A TrajectoryRecorder is used as the tracer passed to solve. Each recorded step
+is stored as one row (t, dt, y[0], ..., y[n-1]) in a preallocated chunk, and
+full chunks are appended to a .npy file whose records have one named float64
+field per column. The row count in the .npy header is rewritten whenever the
+file is flushed, so the file can be loaded (or memory mapped) with np.load at
+any time, also while a long run is still going.
+
+Only every k-th accepted step is recorded when every=k. Derived quantities
+such as the energy are computed afterwards on whole blocks of rows, e.g. when
+exporting columns to text with export_text.
+
+Usage:
+	recorder = TrajectoryRecorder('trace.npy', 4, names=['px', 'py', 'vx', 'vy'])
+	solve(f, a, b, y0, tol, recorder)
+	recorder.close()
+	recorder.export_text('trace.txt', ['px', 'py', 't', lambda rows: np.log10(rows['dt'])])
+"""
+
+import numpy as np
+
+CHUNK = 1 << 14
+
+# Space reserved for the .npy header, so that it can be rewritten in place
+# with any row count
+HEADER_SIZE = 64
+
+def npy_header(dtype, rows, size):
+	"""
+	Version 1.0 .npy header for a 1-d array of rows records, padded to size bytes
+	"""
+	header = "{{'descr': {}, 'fortran_order': False, 'shape': ({},), }}".format(
+		repr(np.lib.format.dtype_to_descr(dtype)), rows)
+	pad = size - 10 - len(header) - 1
+	if pad < 0:
+		return None
+	header = header + ' '*pad + '\n'
+	return b'\x93NUMPY\x01\x00' + np.uint16(len(header)).astype('<u2').tobytes() + header.encode('latin1')
+
+def load(path):
+	"""
+	Memory maps the records of a trajectory file
+	"""
+	return np.load(path, mmap_mode='r')
+
+class TrajectoryRecorder:
+	def __init__(self, path, size, names = None, every = 1, chunk = CHUNK):
+		if names is None:
+			names = ['y{}'.format(i) for i in range(0, size)]
+		if len(names) != size:
+			print("ERROR: Expected {} column names, got {}".format(size, len(names)))
+			return
+		self.path = path
+		self.columns = ['t', 'dt'] + list(names)
+		self.dtype = np.dtype([(name, np.float64) for name in self.columns])
+		self.every = every
+		self.rows = 0
+		self.calls = 0
+
+		# Rows are written through a plain 2-d float view of the chunk
+		self._chunk = np.empty(chunk, dtype=self.dtype)
+		self._buf = self._chunk.view(np.float64).reshape(chunk, len(self.columns))
+		self._count = 0
+
+		self._header_size = HEADER_SIZE
+		while npy_header(self.dtype, 10**19, self._header_size) is None:
+			self._header_size += HEADER_SIZE
+		self._file = open(path, 'wb')
+		self._write_header()
+
+	def _write_header(self):
+		self._file.seek(0)
+		self._file.write(npy_header(self.dtype, self.rows, self._header_size))
+		self._file.seek(0, 2)
+
+	def __call__(self, stime, Y):
+		self.calls += 1
+		if self.every > 1 and (self.calls - 1) % self.every != 0:
+			return
+		row = self._buf[self._count]
+		row[0] = stime.time
+		row[1] = stime.dt
+		row[2:] = Y.vec
+		self._count += 1
+		if self._count == self._buf.shape[0]:
+			self.flush()
+
+	def flush(self):
+		"""
+		Appends the buffered rows to the file and updates the header
+		"""
+		if self._count > 0:
+			self._file.write(self._chunk[0:self._count].tobytes())
+			self.rows += self._count
+			self._count = 0
+		self._write_header()
+		self._file.flush()
+
+	def close(self):
+		if self._file.closed:
+			return
+		self.flush()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def data(self):
+		"""
+		Returns the recorded rows as a memory mapped record array
+		"""
+		if not self._file.closed:
+			self.flush()
+		return load(self.path)
+
+	def export_text(self, path, columns, block = CHUNK):
+		"""
+		Writes the given columns to a text file, one line per recorded row. A
+		column is either the name of a recorded column or a function that
+		computes a derived quantity from a block of rows, e.g.
+			lambda rows: rows['vx']**2 + rows['vy']**2
+		"""
+		rows = self.data()
+		out = open(path, 'w')
+		for start in range(0, rows.shape[0], block):
+			part = rows[start:start+block]
+			values = []
+			for column in columns:
+				if callable(column):
+					values.append(np.asarray(column(part), dtype=np.float64))
+				else:
+					values.append(part[column])
+			np.savetxt(out, np.column_stack(values), fmt='%.17g')
+		out.close()